@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+from ingestion import read_spending_csv, concat_spending_frames
+
+# Batch upload limits, overridable per deployment
+UPLOAD_BATCH_WORKERS = int(os.environ.get("UPLOAD_BATCH_WORKERS", os.cpu_count() or 1))
+UPLOAD_BATCH_MAX_FILES = int(os.environ.get("UPLOAD_BATCH_MAX_FILES", 50))
+# The whole batch is held in memory while it is parsed, so its total size is capped as well as each file's
+UPLOAD_BATCH_MAX_BYTES = int(os.environ.get("UPLOAD_BATCH_MAX_BYTES", 1024 * 1024 * 1024))
+
+# Columns that identify one transaction across overlapping exports
+DEDUPE_COLUMNS = ['Date', 'Account', 'Payee', 'Category Group', 'Category', 'Outflow', 'Inflow']
+
+
+def parse_export(data: bytes) -> pd.DataFrame:
+    """Parse and clean one export's bytes; runs in a worker process."""
+    _, frame = read_spending_csv(io.BytesIO(data))
+    return frame
+
+
+def batch_key(keys) -> str:
+    # The same set of exports in any order maps to one cache entry
+    digest = hashlib.sha256(b"batch")
+    for key in sorted(set(keys)):
+        digest.update(key.encode())
+    return digest.hexdigest()
+
+
+def dedupe_transactions(frames):
+    """Merge cleaned frames, keeping a transaction exported in several files once.
+
+    Identical rows within one file are separate purchases (two coffees on the same day), so
+    each is numbered by its occurrence in its own file and a row is dropped only when an
+    earlier file already had that occurrence. Returns (merged frame, rows removed).
+    """
+    frames = [frame for frame in frames if len(frame)]
+    if len(frames) <= 1:
+        return concat_spending_frames(frames), 0
+    columns = [column for column in DEDUPE_COLUMNS if all(column in frame.columns for frame in frames)]
+    occurrence = pd.concat([frame.groupby(columns, observed=True, dropna=False, sort=False).cumcount()
+                            for frame in frames], ignore_index=True)
+    merged = concat_spending_frames(frames)
+    merged['_occurrence'] = occurrence.to_numpy()
+    keep = ~merged.duplicated(columns + ['_occurrence'])
+    removed = int((~keep).sum())
+    merged = merged[keep.to_numpy()].drop(columns='_occurrence').reset_index(drop=True)
+    return merged, removed
+
+
+class BatchParser:
+    """Parses many exports at once on a pool of worker processes, one file per task."""
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or UPLOAD_BATCH_WORKERS
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Started on first use; spawn rather than fork, since the app process runs threads
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    async def parse(self, contents):
+        """Parse each export's bytes in parallel. Results keep input order, with exceptions in place of failed files."""
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        results = await asyncio.gather(*(loop.run_in_executor(pool, parse_export, data) for data in contents),
+                                       return_exceptions=True)
+        if any(isinstance(result, BrokenProcessPool) for result in results):
+            # A worker died; the next batch gets a fresh pool
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
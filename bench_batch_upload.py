@@ -0,0 +1,48 @@
+import asyncio
+import io
+import os
+import time
+from batch_upload import BatchParser, dedupe_transactions, parse_export
+from synthetic_data import write_export
+
+def make_exports(files: int, rows: int):
+    # One export per "year", each with its own seed
+    exports = []
+    for i in range(files):
+        buffer = io.StringIO()
+        write_export(buffer, rows, seed=i, end=f"{2025 - i}-12-31", days=365)
+        exports.append(buffer.getvalue().encode('utf-8'))
+    return exports
+
+def sequential(exports):
+    return dedupe_transactions([parse_export(data) for data in exports])
+
+def parallel(exports, workers: int):
+    parser = BatchParser(max_workers=workers)
+    try:
+        # Warm the pool so worker start-up is not part of the timing
+        asyncio.run(parser.parse(exports[:1] * workers))
+        start = time.perf_counter()
+        frames = asyncio.run(parser.parse(exports))
+        for frame in frames:
+            if isinstance(frame, Exception):
+                raise frame
+        dedupe_transactions(frames)
+        return time.perf_counter() - start
+    finally:
+        parser.shutdown()
+
+def main():
+    cores = os.cpu_count() or 1
+    print(f"{'files':>6} {'rows/file':>10} {'workers':>8} {'sequential (s)':>15} {'pool (s)':>9} {'speedup':>8}")
+    for files, rows in [(4, 100_000), (8, 100_000), (8, 500_000)]:
+        exports = make_exports(files, rows)
+        start = time.perf_counter()
+        sequential(exports)
+        baseline = time.perf_counter() - start
+        for workers in sorted({1, 2, 4, cores}):
+            seconds = parallel(exports, workers)
+            print(f"{files:>6} {rows:>10} {workers:>8} {baseline:>15.3f} {seconds:>9.3f} {baseline / seconds:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
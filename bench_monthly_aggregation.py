@@ -0,0 +1,55 @@
+import time
+import numpy as np
+import pandas as pd
+from cube import SpendingCube
+from main import build_monthly_summary
+
+CATEGORY_GROUPS = ['Needs', 'Wants', 'Savings', 'Inflow']
+
+def make_frame(rows: int, months: int, seed: int = 0) -> pd.DataFrame:
+    # Already-cleaned frame (amounts in cents), as process_spending_data sees it after preprocessing
+    rng = np.random.default_rng(seed)
+    period = rng.integers(0, months, rows)
+    return pd.DataFrame({
+        'Year': 2000 + period // 12,
+        'Month': period % 12 + 1,
+        'Category Group': pd.Categorical(rng.choice(CATEGORY_GROUPS, rows)),
+        'Outflow': rng.integers(0, 50000, rows),
+        'Inflow': np.where(rng.random(rows) < 0.05, rng.integers(0, 300000, rows), 0),
+    })
+
+def legacy_monthly_totals(df: pd.DataFrame):
+    # The per-month Python loop process_spending_data used before the grouped pass
+    totals = []
+    for (year, month), group in df.groupby(['Year', 'Month']):
+        month_name = pd.to_datetime(str(month), format='%m').strftime('%B')
+        totals.append((
+            f"{month_name} {year}",
+            group['Outflow'].sum() - group['Inflow'].sum(),
+            group[group['Category Group'] == 'Needs']['Outflow'].sum(),
+            group[group['Category Group'] == 'Wants']['Outflow'].sum(),
+            group[~group['Category Group'].isin(['Needs', 'Wants'])]['Outflow'].sum(),
+        ))
+    return totals
+
+def vectorized_monthly_totals(df: pd.DataFrame):
+    return build_monthly_summary(SpendingCube.from_frame(df).monthly_totals(), 5000.0)
+
+def best_of(fn, df, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    print(f"{'rows':>10} {'months':>7} {'legacy (s)':>11} {'cube (s)':>12} {'speedup':>8}")
+    for rows, months in [(10_000, 12), (100_000, 60), (1_000_000, 120), (1_000_000, 600), (5_000_000, 600)]:
+        df = make_frame(rows, months)
+        legacy = best_of(legacy_monthly_totals, df)
+        grouped = best_of(vectorized_monthly_totals, df)
+        print(f"{rows:>10} {months:>7} {legacy:>11.4f} {grouped:>12.4f} {legacy / grouped:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
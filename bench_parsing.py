@@ -0,0 +1,52 @@
+import time
+import numpy as np
+import pandas as pd
+from parsing import parse_currency_cents, parse_dates
+
+def make_columns(rows: int, seed: int = 0):
+    # Amount and date columns shaped like a YNAB export: mostly "$0.00" inflows, dates repeating within a decade
+    rng = np.random.default_rng(seed)
+    outflow_cents = rng.integers(0, 250000, rows)
+    inflow_cents = np.where(rng.random(rows) < 0.05, rng.integers(0, 500000, rows), 0)
+    days = pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.integers(0, 3650, rows), unit="D")
+    return (
+        pd.Series([f"${cents / 100:,.2f}" for cents in outflow_cents], dtype=object),
+        pd.Series([f"${cents / 100:,.2f}" for cents in inflow_cents], dtype=object),
+        pd.Series(days.strftime('%m/%d/%Y'), dtype=object),
+    )
+
+def legacy_currency(outflow, inflow):
+    # The regex cleanup process_spending_data used to run
+    return (pd.to_numeric(outflow.astype(str).str.replace(r'[^\d.]', '', regex=True), errors='coerce'),
+            pd.to_numeric(inflow.astype(str).str.replace(r'[^\d.]', '', regex=True), errors='coerce'))
+
+def fast_currency(outflow, inflow):
+    return parse_currency_cents(outflow), parse_currency_cents(inflow)
+
+def legacy_dates(dates):
+    return pd.to_datetime(dates, format='%m/%d/%Y')
+
+def fast_dates(dates):
+    return parse_dates(dates)
+
+def best_of(fn, columns, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*columns)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    # Amounts and dates are timed apart, so the date cache's win can't hide a slower amount parser
+    print(f"{'rows':>10} {'column':<10} {'regex (s)':>10} {'parsing (s)':>12} {'speedup':>8}")
+    for rows in [10_000, 100_000, 1_000_000]:
+        outflow, inflow, dates = make_columns(rows)
+        for column, legacy, fast, columns in [('currency', legacy_currency, fast_currency, (outflow, inflow)),
+                                              ('dates', legacy_dates, fast_dates, (dates,))]:
+            before = best_of(legacy, columns)
+            after = best_of(fast, columns)
+            print(f"{rows:>10} {column:<10} {before:>10.4f} {after:>12.4f} {before / after:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import statistics
+import subprocess
+import sys
+
+# Each case runs in a fresh interpreter, so nothing is already imported
+CASES = [
+    ("app only (LLM stack lazy)", "import main"),
+    ("app + LLM stack", "import main, llm_stack; llm_stack.preload()"),
+    ("LLM stack alone", "import llm_stack; llm_stack.preload()"),
+]
+
+def import_seconds(code: str) -> float:
+    timed = f"import time; start = time.perf_counter(); {code}; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, "-c", timed], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main():
+    print(f"{'case':<28} {'median (s)':>11} {'min (s)':>9}")
+    for name, code in CASES:
+        samples = [import_seconds(code) for _ in range(5)]
+        print(f"{name:<28} {statistics.median(samples):>11.3f} {min(samples):>9.3f}")
+
+if __name__ == "__main__":
+    main()
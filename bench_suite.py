@@ -0,0 +1,185 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from langchain_core.language_models import FakeListChatModel
+import main
+from ingestion import read_spending_csv, REQUIRED_COLUMNS
+from llm_stack import SharedLLM
+from sessions import SessionStore
+from synthetic_data import SIZES, write_export
+from trends import TrendEngine
+from upload_cache import UploadCache
+
+STAGES = ['read_spending_csv', 'process_spending_data', 'calculate_50_30_recommendations', 'trends', 'upload_cold', 'upload_warm']
+RESULTS_DIR = "bench_results"
+MONTHLY_INFLOW = 6000.0
+
+
+def dataset_path(data_dir: str, rows: int, seed: int = 0) -> str:
+    # Generated exports are reused between runs; 10M rows takes about a minute to write
+    path = os.path.join(data_dir, f"synthetic-{rows}-{seed}.csv")
+    if not os.path.exists(path):
+        scratch = path + ".partial"
+        with open(scratch, "w", encoding="utf-8", newline="") as f:
+            write_export(f, rows, seed=seed)
+        os.replace(scratch, path)
+    return path
+
+
+class UploadClient:
+    """Posts exports to /uploadfile/ in-process, with a stand-in LLM and a private upload cache."""
+
+    def __init__(self, cache_dir: str):
+        os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+        main.shared_llm = SharedLLM(factory=lambda **kwargs: FakeListChatModel(responses=["Final Answer: ok"]))
+        main.upload_cache = UploadCache(cache_dir)
+        self.cache_dir = cache_dir
+        self.client = TestClient(main.app)
+
+    def post(self, path: str):
+        # A fresh session store each time, so the previous upload's frame is not kept alive
+        main.sessions = SessionStore(memory_factory=main.create_chat_memory)
+        with open(path, "rb") as f:
+            response = self.client.post("/uploadfile/", files={"csv_file": (os.path.basename(path), f, "text/csv")},
+                                        data={"monthly_inflow": str(MONTHLY_INFLOW)})
+        result = response.json()
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result
+
+
+def stage_setup(stage: str, path: str, client: UploadClient):
+    """Return a zero-argument callable for a stage; inputs it needs are prepared here, outside the timings."""
+    if stage == 'read_spending_csv':
+        def run():
+            with open(path, "rb") as f:
+                return read_spending_csv(f)
+        return run
+    if stage == 'process_spending_data':
+        raw = pd.read_csv(path, usecols=REQUIRED_COLUMNS, dtype=object)
+        # process_spending_data cleans its frame in place, so each run gets its own copy
+        return lambda: main.process_spending_data(raw.copy(), MONTHLY_INFLOW)
+    if stage == 'calculate_50_30_recommendations':
+        # The cleaned, dollar-valued frame process_spending_data leaves behind
+        df = pd.read_csv(path, usecols=REQUIRED_COLUMNS, dtype=object)
+        main.process_spending_data(df, MONTHLY_INFLOW)
+        return lambda: main.calculate_50_30_recommendations(df, MONTHLY_INFLOW)
+    if stage == 'trends':
+        with open(path, "rb") as f:
+            cube, _ = read_spending_csv(f)
+        return lambda: TrendEngine.from_cube(cube).report()
+    if stage == 'upload_cold':
+        def run():
+            # Clear the cache so every run parses the file
+            for name in os.listdir(client.cache_dir):
+                shutil.rmtree(os.path.join(client.cache_dir, name), ignore_errors=True)
+            return client.post(path)
+        return run
+    if stage == 'upload_warm':
+        client.post(path)
+        return lambda: client.post(path)
+    raise ValueError(f"Unknown stage {stage!r}")
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_bytes(fn) -> int:
+    # Separate from the timed runs, since tracing allocations slows them down
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+            "platform": platform.platform(), "cpu_count": os.cpu_count(), "commit": commit}
+
+
+def run_suite(sizes, stages=None, repeat: int = 3, data_dir: str = None, progress=print) -> dict:
+    stages = stages or STAGES
+    data_dir = data_dir or tempfile.gettempdir()
+    os.makedirs(data_dir, exist_ok=True)
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        client = UploadClient(cache_dir)
+        for rows in sizes:
+            path = dataset_path(data_dir, rows)
+            for stage in stages:
+                fn = stage_setup(stage, path, client)
+                # Large inputs are timed once; the variance there is small next to the run time
+                seconds = best_of(fn, repeat if rows <= 1_000_000 else 1)
+                peak = peak_bytes(fn)
+                results.append({"rows": rows, "stage": stage, "seconds": seconds, "peak_bytes": peak})
+                progress(f"{rows:>10} {stage:<32} {seconds:>9.3f}s {peak / 2**20:>9.1f} MiB")
+                del fn
+    return {"created": datetime.datetime.now().isoformat(timespec="seconds"), "environment": environment(),
+            "results": results}
+
+
+def compare(current: dict, baseline: dict):
+    """Print time and peak-memory ratios against a baseline run; above 1.0x is slower or larger."""
+    before = {(result["rows"], result["stage"]): result for result in baseline["results"]}
+    print(f"{'rows':>10} {'stage':<32} {'time':>8} {'memory':>8}")
+    for result in current["results"]:
+        old = before.get((result["rows"], result["stage"]))
+        if old is None:
+            continue
+        print(f"{result['rows']:>10} {result['stage']:<32} {result['seconds'] / old['seconds']:>7.2f}x "
+              f"{result['peak_bytes'] / max(old['peak_bytes'], 1):>7.2f}x")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Time parsing, summaries and uploads on synthetic YNAB exports.")
+    parser.add_argument("--sizes", nargs="+", default=['10k', '1m'], help=f"row counts or {', '.join(SIZES)}")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=None, help="where generated exports are kept between runs")
+    parser.add_argument("--output", default=None, help=f"results file (default {RESULTS_DIR}/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="an earlier results file to compare against")
+    args = parser.parse_args()
+
+    sizes = [SIZES.get(size.lower()) or int(size) for size in args.sizes]
+    report = run_suite(sizes, args.stages, args.repeat, args.data_dir)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from llm_stack import create_token_emitter
+
+# Agent worker pool limits, overridable per deployment
+CHAT_MAX_WORKERS = int(os.environ.get("CHAT_MAX_WORKERS", 8))
+CHAT_MAX_QUEUE = int(os.environ.get("CHAT_MAX_QUEUE", 32))
+CHAT_MAX_PER_SESSION = int(os.environ.get("CHAT_MAX_PER_SESSION", 1))
+CHAT_TIMEOUT_SECONDS = float(os.environ.get("CHAT_TIMEOUT_SECONDS", 120))
+
+
+class ChatBusy(Exception):
+    pass
+
+
+class ChatTimeout(Exception):
+    pass
+
+
+class ChatExecutor:
+    """Runs blocking agent calls on a bounded thread pool, off the event loop.
+
+    A call is refused with ChatBusy when the pool and its queue are full or the session
+    already has max_per_session calls in flight. A call that outlives timeout_seconds
+    raises ChatTimeout to the caller. Its thread keeps its slot until the agent returns,
+    so runaway calls still count as load.
+    """
+
+    def __init__(self, max_workers: int = None, max_queue: int = None, max_per_session: int = None,
+                 timeout_seconds: float = None):
+        self.max_workers = max_workers or CHAT_MAX_WORKERS
+        self.max_queue = max_queue if max_queue is not None else CHAT_MAX_QUEUE
+        self.max_per_session = max_per_session or CHAT_MAX_PER_SESSION
+        self.timeout_seconds = timeout_seconds or CHAT_TIMEOUT_SECONDS
+        self.in_flight = 0
+        self._per_session = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="chat")
+
+    def _acquire(self, session_token: str):
+        with self._lock:
+            if self.in_flight >= self.max_workers + self.max_queue:
+                raise ChatBusy("The assistant is busy, please try again shortly.")
+            if self._per_session.get(session_token, 0) >= self.max_per_session:
+                raise ChatBusy("Please wait for your previous question to finish.")
+            self.in_flight += 1
+            self._per_session[session_token] = self._per_session.get(session_token, 0) + 1
+
+    def _release(self, session_token: str):
+        with self._lock:
+            self.in_flight -= 1
+            remaining = self._per_session.get(session_token, 1) - 1
+            if remaining:
+                self._per_session[session_token] = remaining
+            else:
+                self._per_session.pop(session_token, None)
+
+    def submit(self, session_token: str, fn, *args):
+        self._acquire(session_token)
+        try:
+            future = self._pool.submit(fn, *args)
+        except RuntimeError:
+            self._release(session_token)
+            raise
+        future.add_done_callback(lambda _: self._release(session_token))
+        return future
+
+    async def run(self, session_token: str, fn, *args):
+        """Run fn(*args) on the pool and await its result."""
+        future = self.submit(session_token, fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            raise ChatTimeout("The assistant took too long to answer, please try again.")
+
+    def stream(self, session_token: str, fn, *args):
+        """Start fn(emit, *args) on the pool and return an async iterator of the (event, data) pairs it emits.
+
+        ChatBusy is raised here, before any response has been sent.
+        """
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        done = object()
+
+        def emit(event: str, data):
+            loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+        def work():
+            try:
+                fn(emit, *args)
+            except Exception as e:
+                emit("error", str(e))
+            finally:
+                loop.call_soon_threadsafe(events.put_nowait, done)
+
+        self.submit(session_token, work)
+        return self._drain(events, done, loop.time() + self.timeout_seconds)
+
+    async def _drain(self, events: asyncio.Queue, done, deadline: float):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                item = await asyncio.wait_for(events.get(), max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                yield "error", "The assistant took too long to answer, please try again."
+                return
+            if item is done:
+                return
+            yield item
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def stream_agent(emit, agent, message: str, callbacks=()):
+    """Run the agent, emitting tokens, tool calls, tool results and the final answer, which is returned."""
+    output = None
+    for chunk in agent.stream({"input": message}, config={"callbacks": [create_token_emitter(emit), *callbacks]}):
+        for action in chunk.get("actions", []):
+            emit("step", {"tool": action.tool, "tool_input": str(action.tool_input)})
+        for step in chunk.get("steps", []):
+            emit("observation", str(step.observation))
+        if "output" in chunk:
+            output = chunk["output"]
+            emit("final", output)
+    return output
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
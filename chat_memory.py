@@ -0,0 +1,163 @@
+import os
+import threading
+from collections import OrderedDict, deque
+from instrumentation import metrics
+
+# Tokens of conversation context sent with each agent question, overridable per deployment
+CHAT_MEMORY_TOKEN_BUDGET = int(os.environ.get("CHAT_MEMORY_TOKEN_BUDGET", 1200))
+# "extractive" folds old turns into the summary locally; "llm" asks the chat model to rewrite it
+CHAT_MEMORY_SUMMARIZER = os.environ.get("CHAT_MEMORY_SUMMARIZER", "extractive")
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text; counting exactly would need an API call
+    return (len(text) + 3) // 4
+
+
+def clip_tokens(text: str, budget: int, count_tokens=estimate_tokens, keep: str = "start") -> str:
+    """Shorten text to fit budget, keeping its start (or its end, for keep="end")."""
+    if count_tokens(text) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        candidate = text[:middle] if keep == "start" else text[len(text) - middle:]
+        if count_tokens(candidate + "…") <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + "…" if keep == "start" else "…" + text[len(text) - low:]
+
+
+def summarize_turns(summary: str, turns) -> str:
+    """Append a one-line digest of each turn to the summary; the memory trims it from the front."""
+    digests = [f"asked \"{question}\" -> {answer.splitlines()[0] if answer else ''}" for question, answer in turns]
+    return "; ".join(part for part in [summary, *digests] if part)
+
+
+class LLMSummarizer:
+    """Has the chat model rewrite the running summary to include turns leaving the window."""
+
+    def __init__(self, get_llm, max_words: int = 120):
+        self.get_llm = get_llm
+        self.max_words = max_words
+
+    def __call__(self, summary: str, turns) -> str:
+        conversation = "\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+        prompt = (f"Update the running summary of a conversation about the user's spending data. Keep every dollar "
+                  f"amount and month mentioned, and stay under {self.max_words} words.\n\n"
+                  f"Summary so far:\n{summary or '(none)'}\n\nNew turns:\n{conversation}\n\nUpdated summary:")
+        response = self.get_llm().invoke(prompt)
+        return getattr(response, "content", response).strip()
+
+
+class ChatMemory:
+    """Conversation context for one session's agent, kept within a token budget.
+
+    Recent turns are kept verbatim in a sliding window. Turns that fall out of the window are
+    folded into a running summary, and figures already computed from the data are kept as
+    facts. The budget is split between facts, summary and window, so the rendered context
+    stays the same size however long the conversation runs.
+
+    The summarizer may be a model call, so it never runs under the memory's lock: rolled
+    turns wait in pending until fold() runs, which add_turn does itself unless told not to.
+    """
+
+    def __init__(self, token_budget: int = None, summarizer=None, count_tokens=estimate_tokens):
+        self.token_budget = token_budget or CHAT_MEMORY_TOKEN_BUDGET
+        self.fact_budget = self.token_budget // 4
+        self.summary_budget = self.token_budget // 4
+        self.window_budget = self.token_budget - self.fact_budget - self.summary_budget
+        self.summarizer = summarizer or summarize_turns
+        self.count_tokens = count_tokens
+        self.turns = deque()
+        self.summary = ""
+        self.facts = OrderedDict()
+        self.pending = []
+        self._window_tokens = 0
+        # Bumped when the data changes, so a fold started before then doesn't write back its summary
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._fold_lock = threading.Lock()
+
+    def _turn_tokens(self, turn) -> int:
+        return self.count_tokens(f"User: {turn[0]}\nAssistant: {turn[1]}\n")
+
+    def add_turn(self, question: str, answer: str, fold: bool = True):
+        """Add a turn to the window. With fold=False, turns it pushes out wait for a later fold(),
+        e.g. one run off the event loop."""
+        # A single turn may use at most half the window, so one long answer can't push out everything else
+        half = self.window_budget // 2
+        turn = (clip_tokens(question, half // 3, self.count_tokens), clip_tokens(answer, half - half // 3, self.count_tokens))
+        with self._lock:
+            self.turns.append(turn)
+            self._window_tokens += self._turn_tokens(turn)
+            while self._window_tokens > self.window_budget and len(self.turns) > 1:
+                oldest = self.turns.popleft()
+                self._window_tokens -= self._turn_tokens(oldest)
+                self.pending.append(oldest)
+        if fold:
+            self.fold()
+
+    def fold(self):
+        """Fold pending turns into the summary. A failing summarizer falls back to the local digest."""
+        with self._fold_lock:
+            with self._lock:
+                rolled, self.pending = self.pending, []
+                summary, generation = self.summary, self._generation
+            if not rolled:
+                return
+            try:
+                summary = self.summarizer(summary, rolled)
+            except Exception:
+                metrics.increment("chat_memory.summarizer_errors")
+                summary = summarize_turns(summary, rolled)
+            with self._lock:
+                if self._generation == generation:
+                    self.summary = clip_tokens(summary, self.summary_budget, self.count_tokens, keep="end")
+
+    def forget_figures(self):
+        """Drop facts and the summary, whose figures came from data that has since changed.
+
+        The recent turns stay, so the conversation still reads naturally.
+        """
+        with self._lock:
+            self.facts.clear()
+            self.summary = ""
+            self.pending = []
+            self._generation += 1
+
+    def remember(self, facts: dict):
+        """Keep computed figures, e.g. {"Spending on Groceries in August 2025": "$412.80"}; the oldest go first."""
+        with self._lock:
+            for name, value in facts.items():
+                self.facts[name] = value
+                self.facts.move_to_end(name)
+            while self.facts and self.count_tokens(self._facts_text()) > self.fact_budget:
+                self.facts.popitem(last=False)
+
+    def _facts_text(self) -> str:
+        return "\n".join(f"- {name}: {value}" for name, value in self.facts.items())
+
+    def context(self) -> str:
+        with self._lock:
+            sections = []
+            if self.facts:
+                sections.append("Figures already computed from the data (reuse them rather than recalculating):\n"
+                                + self._facts_text())
+            if self.summary:
+                sections.append(f"Summary of the earlier conversation: {self.summary}")
+            if self.turns:
+                sections.append("Recent conversation:\n" + "\n".join(f"User: {question}\nAssistant: {answer}"
+                                                                     for question, answer in self.turns))
+            return "\n\n".join(sections)
+
+    def render(self, message: str) -> str:
+        """The agent input for message: the remembered context, then the question itself."""
+        context = self.context()
+        if not context:
+            return message
+        return f"{context}\n\nCurrent question: {message}"
+
+    def tokens(self) -> int:
+        return self.count_tokens(self.context())
@@ -0,0 +1,23 @@
+import pytest
+import main
+from llm_stack import SharedLLM
+from query_router import QueryRouter
+from sessions import SessionStore
+from upload_cache import UploadCache
+
+@pytest.fixture
+def isolated_app(monkeypatch, tmp_path):
+    """Point the app at a fresh session store, upload cache and query router for one test.
+
+    Call it with the chat model factory the test needs and, optionally, a stand-in for
+    create_pandas_dataframe_agent.
+    """
+    def configure(llm_factory=lambda **kwargs: None, create_agent=None):
+        monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+        monkeypatch.setattr(main, "shared_llm", SharedLLM(factory=llm_factory))
+        if create_agent is not None:
+            monkeypatch.setattr(main, "create_pandas_dataframe_agent", create_agent)
+        monkeypatch.setattr(main, "sessions", SessionStore(memory_factory=main.create_chat_memory))
+        monkeypatch.setattr(main, "upload_cache", UploadCache(str(tmp_path / "uploads")))
+        monkeypatch.setattr(main, "query_router", QueryRouter())
+    return configure
@@ -0,0 +1,201 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from instrumentation import span
+
+# String dimensions of the cube, after (Year, Month)
+DIMENSIONS = ['Category Group', 'Category', 'Payee', 'Account']
+MEASURES = ['outflow', 'inflow', 'count']
+TOTAL_COLUMNS = ['outflow', 'inflow', 'needs', 'wants', 'other']
+DICTIONARY_FILE = "dictionaries.json"
+
+
+class SpendingCube:
+    """Outflow and inflow sums (in cents) and transaction counts per (year, month, group, category, payee, account).
+
+    Each dimension value is stored once in a dictionary and referenced by an int32 code; the
+    cells live in parallel NumPy arrays. append() folds new transactions into existing cells
+    and only adds cells for keys it hasn't seen, so adding a delta export never touches history.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.rows = 0
+        self.version = 0
+        self.dictionaries = {dimension: [] for dimension in DIMENSIONS}
+        self._codes = {dimension: {} for dimension in DIMENSIONS}
+        self.period = np.empty(0, dtype=np.int32)
+        self.codes = {dimension: np.empty(0, dtype=np.int32) for dimension in DIMENSIONS}
+        self.measures = {measure: np.empty(0, dtype=np.int64) for measure in MEASURES}
+        self._index = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, cents: bool = True) -> "SpendingCube":
+        cube = cls()
+        cube.append(df, cents=cents)
+        return cube
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.period, *self.codes.values(), *self.measures.values()]
+        return sum(array.nbytes for array in arrays)
+
+    def _encode(self, dimension: str, values) -> np.ndarray:
+        # Map a column to global dictionary codes, adding values seen for the first time
+        local_codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        codes = self._codes[dimension]
+        dictionary = self.dictionaries[dimension]
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            key = None if pd.isna(value) else value
+            code = codes.get(key)
+            if code is None:
+                code = codes[key] = len(dictionary)
+                dictionary.append(key)
+            mapping[i] = code
+        return mapping[local_codes]
+
+    def _cell_keys(self, start: int = 0, stop: int = None):
+        stop = self.size if stop is None else stop
+        columns = [self.period[start:stop]] + [self.codes[dimension][start:stop] for dimension in DIMENSIONS]
+        return zip(*(column.tolist() for column in columns))
+
+    def _grow(self, extra: int):
+        # Reallocate with headroom so repeated small appends stay amortized O(1) per cell
+        capacity = len(self.period)
+        needed = self.size + extra
+        if needed <= capacity and self.period.flags.writeable:
+            return
+        capacity = max(needed, capacity * 2, 64)
+
+        def resized(array):
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            return grown
+
+        self.period = resized(self.period)
+        self.codes = {dimension: resized(array) for dimension, array in self.codes.items()}
+        self.measures = {measure: resized(array) for measure, array in self.measures.items()}
+
+    def append(self, df: pd.DataFrame, cents: bool = True):
+        """Fold cleaned transactions into the cube; Outflow/Inflow are int cents, or dollars with cents=False."""
+        if len(df) == 0:
+            return
+        with span("aggregate.cube_append"):
+            self._append(df, cents)
+
+    def _append(self, df: pd.DataFrame, cents: bool):
+        rows = len(df)
+        if 'Year' in df.columns:
+            period = df['Year'].to_numpy(dtype=np.int64) * 12 + df['Month'].to_numpy(dtype=np.int64) - 1
+        else:
+            period = np.zeros(rows, dtype=np.int64)
+        cells = {'period': period}
+        for dimension in DIMENSIONS:
+            if dimension in df.columns:
+                cells[dimension] = self._encode(dimension, df[dimension])
+            else:
+                cells[dimension] = np.full(rows, self._encode(dimension, np.array([None], dtype=object))[0], dtype=np.int32)
+        for measure, column in (('outflow', 'Outflow'), ('inflow', 'Inflow')):
+            if cents:
+                cells[measure] = df[column].to_numpy(dtype=np.int64)
+            else:
+                # Missing amounts count as zero, as Series.sum() skips them
+                cells[measure] = np.rint(np.nan_to_num(df[column].to_numpy(dtype=float)) * 100).astype(np.int64)
+        cells['count'] = np.ones(rows, dtype=np.int64)
+        grouped = pd.DataFrame(cells).groupby(['period'] + DIMENSIONS, sort=False).sum()
+        keys = grouped.index.to_frame(index=False)
+
+        if self.size == 0:
+            self._grow(len(grouped))
+            positions = np.arange(len(grouped))
+            self.size = len(grouped)
+        else:
+            # The key index is only needed once cells have to be merged
+            if self._index is None:
+                self._index = {key: position for position, key in enumerate(self._cell_keys())}
+            positions = np.empty(len(grouped), dtype=np.int64)
+            new_cells = 0
+            for i, key in enumerate(zip(*(keys[column].tolist() for column in keys.columns))):
+                position = self._index.get(key)
+                if position is None:
+                    position = self._index[key] = self.size + new_cells
+                    new_cells += 1
+                positions[i] = position
+            self._grow(new_cells)
+            self.size += new_cells
+
+        self.period[positions] = keys['period'].to_numpy()
+        for dimension in DIMENSIONS:
+            self.codes[dimension][positions] = keys[dimension].to_numpy()
+        # Grouped keys are unique, so each position is updated once
+        for measure in MEASURES:
+            self.measures[measure][positions] += grouped[measure].to_numpy()
+        self.rows += rows
+        self.version += 1
+
+    def decoded(self, dimension: str) -> pd.Categorical:
+        dtype = pd.CategoricalDtype([value for value in self.dictionaries[dimension] if value is not None])
+        values = np.array(self.dictionaries[dimension], dtype=object)
+        codes = self.codes[dimension][:self.size]
+        return pd.Categorical(values[codes], dtype=dtype)
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per cell: Year, Month, the dimensions, and outflow/inflow cents and counts."""
+        period = self.period[:self.size].astype(np.int64)
+        frame = pd.DataFrame({'Year': period // 12, 'Month': period % 12 + 1})
+        for dimension in DIMENSIONS:
+            frame[dimension] = self.decoded(dimension)
+        for measure in MEASURES:
+            frame[measure] = self.measures[measure][:self.size]
+        return frame
+
+    def monthly_totals(self) -> pd.DataFrame:
+        """Per-month outflow, inflow and Needs/Wants/other outflow, in dollars, indexed by (Year, Month)."""
+        with span("aggregate.monthly"):
+            return self._monthly_totals()
+
+    def _monthly_totals(self) -> pd.DataFrame:
+        period = self.period[:self.size].astype(np.int64)
+        groups = np.array(self.dictionaries['Category Group'], dtype=object)
+        group = groups[self.codes['Category Group'][:self.size]]
+        is_needs = group == 'Needs'
+        is_wants = group == 'Wants'
+        outflow = self.measures['outflow'][:self.size]
+        columns = pd.DataFrame({
+            'Year': period // 12,
+            'Month': period % 12 + 1,
+            'outflow': outflow,
+            'inflow': self.measures['inflow'][:self.size],
+            'needs': np.where(is_needs, outflow, 0),
+            'wants': np.where(is_wants, outflow, 0),
+            'other': np.where(is_needs | is_wants, 0, outflow),
+        }, columns=['Year', 'Month'] + TOTAL_COLUMNS)
+        return columns.groupby(['Year', 'Month'], sort=True).sum() / 100
+
+    def save(self, path: str):
+        np.save(os.path.join(path, "period.npy"), self.period[:self.size])
+        for dimension, array in self.codes.items():
+            np.save(os.path.join(path, f"code-{DIMENSIONS.index(dimension)}.npy"), array[:self.size])
+        for measure, array in self.measures.items():
+            np.save(os.path.join(path, f"{measure}.npy"), array[:self.size])
+        with open(os.path.join(path, DICTIONARY_FILE), "w") as f:
+            json.dump({"rows": self.rows, "dictionaries": self.dictionaries}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "SpendingCube":
+        """Load a saved cube with its arrays memory-mapped read-only; the first append copies them."""
+        cube = cls()
+        with open(os.path.join(path, DICTIONARY_FILE)) as f:
+            saved = json.load(f)
+        cube.rows = saved["rows"]
+        cube.dictionaries = saved["dictionaries"]
+        cube._codes = {dimension: {value: code for code, value in enumerate(values)}
+                       for dimension, values in cube.dictionaries.items()}
+        cube.period = np.load(os.path.join(path, "period.npy"), mmap_mode='r')
+        cube.codes = {dimension: np.load(os.path.join(path, f"code-{i}.npy"), mmap_mode='r')
+                      for i, dimension in enumerate(DIMENSIONS)}
+        cube.measures = {measure: np.load(os.path.join(path, f"{measure}.npy"), mmap_mode='r') for measure in MEASURES}
+        cube.size = len(cube.period)
+        return cube
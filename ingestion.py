@@ -0,0 +1,147 @@
+import os
+import pandas as pd
+from pandas.api.types import union_categoricals
+from parsing import parse_currency_cents, parse_dates
+from cube import SpendingCube
+from instrumentation import metrics, span
+
+REQUIRED_COLUMNS = ['Date', 'Category Group', 'Category', 'Outflow', 'Inflow']
+# Kept when the export has them, for payee and account lookups
+OPTIONAL_COLUMNS = ['Payee', 'Account']
+# Repeated strings, stored dictionary-encoded
+STRING_COLUMNS = ['Category Group', 'Category', 'Payee', 'Account']
+
+# Upload limits, overridable per deployment
+UPLOAD_CHUNK_ROWS = int(os.environ.get("UPLOAD_CHUNK_ROWS", 50_000))
+UPLOAD_MAX_ROWS = int(os.environ.get("UPLOAD_MAX_ROWS", 5_000_000))
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 512 * 1024 * 1024))
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class MissingColumns(ValueError):
+    pass
+
+
+def clean_spending_frame(df: pd.DataFrame):
+    # Parse amounts to exact int64 cents; rows with unparseable amounts are dropped
+    outflow_cents = parse_currency_cents(df['Outflow'])
+    inflow_cents = parse_currency_cents(df['Inflow'])
+    valid = (outflow_cents.notna() & inflow_cents.notna()).to_numpy()
+    if not valid.all():
+        metrics.increment("rows.invalid", int((~valid).sum()))
+        df.drop(df.index[~valid], inplace=True)
+    df['Outflow'] = outflow_cents[valid].to_numpy(dtype='int64')
+    df['Inflow'] = inflow_cents[valid].to_numpy(dtype='int64')
+
+    with span("ingest.parse_dates"):
+        df['Date'] = parse_dates(df['Date'], format='%m/%d/%Y')
+    df['Month'] = df['Date'].dt.month.astype('int8')
+    df['Year'] = df['Date'].dt.year.astype('int16')
+    return df
+
+
+def compact_spending_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Keep only the columns we use, with repeated strings dictionary-encoded as categoricals."""
+    columns = [column for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS + ['Month', 'Year'] if column in df.columns]
+    compact = df[columns].reset_index(drop=True)
+    for column in STRING_COLUMNS:
+        if column in compact.columns and not isinstance(compact[column].dtype, pd.CategoricalDtype):
+            compact[column] = compact[column].astype('category')
+    return compact
+
+
+def concat_spending_frames(frames) -> pd.DataFrame:
+    # pd.concat turns categoricals with different categories back into objects, so union them first
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame(columns=REQUIRED_COLUMNS + ['Month', 'Year'])
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    merged = pd.concat(frames, ignore_index=True)
+    for column in STRING_COLUMNS:
+        if all(column in frame.columns and isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames):
+            merged[column] = union_categoricals([frame[column] for frame in frames], ignore_order=True)
+    return merged
+
+
+def memory_report(df: pd.DataFrame) -> dict:
+    """Bytes held by each column of a frame, and in total."""
+    if df is None:
+        return {"rows": 0, "columns": {}, "total_bytes": 0}
+    usage = df.memory_usage(deep=True, index=True)
+    return {
+        "rows": len(df),
+        "columns": {str(column): int(nbytes) for column, nbytes in usage.items()},
+        "total_bytes": int(usage.sum()),
+    }
+
+
+class _ByteLimitedReader:
+    # Wraps an upload stream and stops reading once max_bytes has been consumed
+    def __init__(self, raw, max_bytes: int):
+        self.raw = raw
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+
+    def read(self, size: int = -1):
+        data = self.raw.read(size)
+        self.bytes_read += len(data)
+        if self.bytes_read > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_bytes} byte limit.")
+        return data
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def readline(self, size: int = -1):
+        line = self.raw.readline(size)
+        self.bytes_read += len(line)
+        if self.bytes_read > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_bytes} byte limit.")
+        return line
+
+
+def iter_spending_chunks(file, chunk_rows: int = None, max_rows: int = None, max_bytes: int = None):
+    """Yield cleaned, compacted chunks holding only REQUIRED_COLUMNS, any OPTIONAL_COLUMNS, Month and Year."""
+    chunk_rows = chunk_rows or UPLOAD_CHUNK_ROWS
+    max_rows = max_rows or UPLOAD_MAX_ROWS
+    max_bytes = max_bytes or UPLOAD_MAX_BYTES
+
+    reader = pd.read_csv(_ByteLimitedReader(file, max_bytes), usecols=lambda column: column in REQUIRED_COLUMNS or column in OPTIONAL_COLUMNS,
+                         dtype={column: 'object' for column in ['Category Group', 'Category'] + OPTIONAL_COLUMNS}, chunksize=chunk_rows)
+    rows_read = 0
+    with reader:
+        while True:
+            with span("ingest.read"):
+                chunk = next(reader, None)
+            if chunk is None:
+                break
+            missing = [column for column in REQUIRED_COLUMNS if column not in chunk.columns]
+            if missing:
+                raise MissingColumns("CSV must have 'Outflow', 'Inflow', 'Category', 'Category Group', and 'Date' columns")
+            rows_read += len(chunk)
+            if rows_read > max_rows:
+                raise UploadTooLarge(f"Upload exceeds the {max_rows} row limit.")
+            metrics.increment("rows.read", len(chunk))
+            with span("ingest.clean"):
+                chunk = compact_spending_frame(clean_spending_frame(chunk))
+            yield chunk
+
+
+def read_spending_csv(file, keep_frame: bool = True, **limits):
+    """Stream a YNAB export into a SpendingCube, optionally keeping the slim cleaned frame.
+
+    With keep_frame=False peak memory is bounded by the chunk size and the cube, regardless of file size.
+    """
+    cube = SpendingCube()
+    chunks = []
+    for chunk in iter_spending_chunks(file, **limits):
+        cube.append(chunk)
+        if keep_frame:
+            chunks.append(chunk)
+
+    frame = concat_spending_frames(chunks) if keep_frame else None
+    return cube, frame
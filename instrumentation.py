@@ -0,0 +1,116 @@
+import bisect
+import cProfile
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf'))
+# When set, each request's profile is written here as a .prof file (read with pstats or snakeviz)
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "")
+
+
+class Histogram:
+    """Per-bucket (non-cumulative) counts of observations, plus their count and sum."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {("+Inf" if bound == float('inf') else repr(bound)): count
+                        for bound, count in zip(self.buckets, self.counts)},
+        }
+
+
+class Metrics:
+    """Latency histograms for timed spans and plain counters, safe to update from any thread."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def span(self, name: str):
+        """Time the enclosed block into the `name` histogram, including when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "latency_seconds": {name: histogram.snapshot() for name, histogram in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+# Process-wide metrics, shared by ingestion, the cube and the app
+metrics = Metrics()
+span = metrics.span
+
+_profiling = threading.local()
+
+
+@contextmanager
+def profiled(name: str, directory: str = None, enabled: bool = True, keep=None):
+    """Profile the enclosed block with cProfile and dump it to directory when profiling is on.
+
+    Only one profile runs per thread at a time; a nested or concurrent block on the
+    same thread is left unprofiled rather than failing. When keep is given, the profile
+    is only dumped if keep() is true once the block ends.
+    """
+    directory = PROFILE_DIR if directory is None else directory
+    if not directory or not enabled or getattr(_profiling, "active", False):
+        yield
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler, such as a debugger or coverage, already owns this thread
+        yield
+        return
+    _profiling.active = True
+    try:
+        yield
+    finally:
+        profile.disable()
+        _profiling.active = False
+    if keep is not None and not keep():
+        return
+    os.makedirs(directory, exist_ok=True)
+    label = re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_') or "request"
+    stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}"
+    profile.dump_stats(os.path.join(directory, f"{stamp}-{label}.prof"))
@@ -0,0 +1,98 @@
+import functools
+import os
+import threading
+from instrumentation import metrics
+
+# Chat model used by every agent, overridable per deployment
+LLM_MODEL = os.environ.get("LLM_MODEL", "gemini-1.5-flash")
+
+# The LangChain and Gemini packages take over a second to import, so nothing here imports
+# them at module load; the first chat pays for it instead of every worker boot.
+
+
+def create_llm(**options):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(**options)
+
+
+def create_pandas_dataframe_agent(llm, df, **kwargs):
+    from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
+    return create_pandas_dataframe_agent(llm, df, **kwargs)
+
+
+def create_python_tool(run):
+    """A stand-in for the pandas agent's Python tool, with the same name and description, that calls run(code)."""
+    from langchain_core.tools import Tool
+    return Tool(name="python_repl_ast", func=run,
+                description="A Python shell. Use this to execute python commands. Input should be a valid python "
+                            "command. When using this tool, sometimes output is abbreviated - make sure it does not "
+                            "look abbreviated before using it in your answer.")
+
+
+@functools.lru_cache(maxsize=None)
+def _callback_handlers():
+    # Defined on first use, since they subclass LangChain's callback base
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenEmitter(BaseCallbackHandler):
+        # Forwards each LLM token to the stream as it is generated
+        def __init__(self, emit):
+            self.emit = emit
+
+        def on_llm_new_token(self, token: str, **kwargs):
+            self.emit("token", token)
+
+    class LLMCallCounter(BaseCallbackHandler):
+        """Counts LLM calls, and failed ones, into the shared metrics."""
+
+        def on_llm_start(self, serialized, prompts, **kwargs):
+            metrics.increment("llm.calls")
+
+        def on_chat_model_start(self, serialized, messages, **kwargs):
+            metrics.increment("llm.calls")
+
+        def on_llm_error(self, error, **kwargs):
+            metrics.increment("llm.errors")
+
+    return TokenEmitter, LLMCallCounter
+
+
+def create_token_emitter(emit):
+    """A callback handler that calls emit("token", token) for each token the LLM streams."""
+    return _callback_handlers()[0](emit)
+
+
+def create_llm_call_counter():
+    """A callback handler that counts LLM calls, and failed ones, into the shared metrics."""
+    return _callback_handlers()[1]()
+
+
+def preload():
+    """Import the whole LLM stack now, e.g. to warm a worker before it takes traffic."""
+    import langchain_google_genai  # noqa: F401
+    import langchain_experimental.agents.agent_toolkits  # noqa: F401
+
+
+class SharedLLM:
+    """One chat model client for all sessions, created on first use.
+
+    The client holds the HTTP connection pool, so sharing it lets every agent reuse warm
+    connections instead of each upload opening its own.
+    """
+
+    def __init__(self, factory=None, **options):
+        self.factory = factory or create_llm
+        self.options = options
+        self._llm = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = self.factory(**self.options)
+        return self._llm
+
+    @property
+    def loaded(self) -> bool:
+        return self._llm is not None
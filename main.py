@@ -1,41 +1,98 @@
+import asyncio
 import pandas as pd
-from fastapi import FastAPI, File, UploadFile, Form, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, File, UploadFile, Form, Request, Response
+from typing import List
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.memory import ConversationBufferMemory
 import os
 import io
+import hashlib
+import calendar
+import time
+from sessions import SessionStore, SESSION_COOKIE
+from llm_stack import SharedLLM, create_pandas_dataframe_agent, create_python_tool, create_llm_call_counter, LLM_MODEL
+from chat_memory import ChatMemory, LLMSummarizer, CHAT_MEMORY_SUMMARIZER
+from upload_cache import UploadCache, content_key
+from batch_upload import BatchParser, batch_key, dedupe_transactions, UPLOAD_BATCH_MAX_FILES, UPLOAD_BATCH_MAX_BYTES
+from query_router import QueryRouter, SpendingAggregates, FAST_PATH, AGENT
+from chat_executor import ChatExecutor, ChatBusy, ChatTimeout, stream_agent, format_sse
+from cube import SpendingCube
+from sandbox import PythonSandbox
+from trends import TrendEngine
+from instrumentation import metrics, profiled, span
+from ingestion import clean_spending_frame, concat_spending_frames, memory_report, read_spending_csv, iter_spending_chunks, UPLOAD_MAX_BYTES
 
 app = FastAPI()
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-df_global = None
-monthly_inflow_global = 0
-agent = None
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+# Requests inside the middleware, and how many have started, for telling when a request ran alone
+request_counts = {"in_flight": 0, "started": 0}
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    # Latency per route; with PROFILE_DIR set, also a cProfile dump of the request's event-loop work.
+    # The profiler watches the event-loop thread across the await, so it would record any other
+    # request running at the same time: PROFILE_DIR is for profiling one request at a time, and
+    # a request that overlaps another is not profiled or dumped.
+    start = time.perf_counter()
+    request_counts["in_flight"] += 1
+    request_counts["started"] += 1
+    started = request_counts["started"]
+    try:
+        with profiled(f"{request.method} {request.url.path}", enabled=request_counts["in_flight"] == 1,
+                      keep=lambda: request_counts["started"] == started):
+            response = await call_next(request)
+    finally:
+        request_counts["in_flight"] -= 1
+    route = request.scope.get("route")
+    metrics.observe(f"request {request.method} {route.path if route else request.url.path}", time.perf_counter() - start)
+    return response
+
+# One LLM client for every session's agent, created on the first chat
+shared_llm = SharedLLM(model=LLM_MODEL, temperature=0)
+
+def create_chat_memory():
+    # The LLM summarizer costs a model call whenever turns leave the window, so it is opt-in
+    summarizer = LLMSummarizer(shared_llm.get) if CHAT_MEMORY_SUMMARIZER == "llm" else None
+    return ChatMemory(summarizer=summarizer)
+
+# Per-user data, agent and chat memory, keyed by the session cookie
+sessions = SessionStore(memory_factory=create_chat_memory)
+
+# Parsed uploads and their recommendations, keyed by upload content
+upload_cache = UploadCache()
+
+# Bounded pool that runs agent calls off the event loop
+chat_executor = ChatExecutor()
+
+# Worker processes that parse the files of a batch upload in parallel
+batch_parser = BatchParser()
+
+# Worker processes that run the agents' pandas code under CPU and memory limits
+python_sandbox = PythonSandbox()
+
+# Answers common aggregate questions without the LLM
+query_router = QueryRouter()
 
 def calculate_50_30_recommendations(df: pd.DataFrame, monthly_inflow: float):
-    needs_spending = df[df['Category Group'] == 'Needs']['Outflow'].sum()
-    wants_spending = df[df['Category Group'] == 'Wants']['Outflow'].sum()
-    
-    total_net_spending = df['Outflow'].sum() - df['Inflow'].sum()
+    cube = SpendingCube.from_frame(df, cents=False)
+    return calculate_50_30_recommendations_from_totals(cube.monthly_totals(), monthly_inflow)
 
+def calculate_50_30_recommendations_from_totals(totals: pd.DataFrame, monthly_inflow: float):
+    # Whole-file 50/30 checks from the cube's per-month totals
+    needs_spending = totals['needs'].sum()
+    wants_spending = totals['wants'].sum()
+    total_net_spending = totals['outflow'].sum() - totals['inflow'].sum()
+    return build_50_30_recommendations(needs_spending, wants_spending, total_net_spending, monthly_inflow)
+
+def build_50_30_recommendations(needs_spending: float, wants_spending: float, total_net_spending: float, monthly_inflow: float):
     recommendations = []
 
     if monthly_inflow > 0: # Calculate percentages based on monthly inflow
         needs_percent = (needs_spending / monthly_inflow) * 100
         wants_percent = (wants_spending / monthly_inflow) * 100
 
-        # Debugging: Print calculated percentages
-        print(f"\nNeeds Spending: {needs_spending:.2f}")
-        print(f"Wants Spending: {wants_spending:.2f}")
-        print(f"Total Net Spending: {total_net_spending:.2f}")
-        print(f"Needs Percent (vs Inflow): {needs_percent:.2f}%")
-        print(f"Wants Percent (vs Inflow): {wants_percent:.2f}%")
-
         if needs_percent > 50:
             recommendations.append(f"Your spending on Needs is {needs_percent:.2f}% of your inflow, which is over the recommended 50%. Consider reviewing these essential expenses.")
         if wants_percent > 30:
@@ -59,29 +116,35 @@ def calculate_50_30_recommendations(df: pd.DataFrame, monthly_inflow: float):
     return recommendations
 
 def process_spending_data(df: pd.DataFrame, monthly_inflow: float):
-    # Preprocessing
-    # Remove all non-digit characters except for the decimal point
-    df['Outflow'] = df['Outflow'].astype(str).str.replace(r'[^\d.]', '', regex=True)
-    df['Outflow'] = pd.to_numeric(df['Outflow'], errors='coerce')
-    df['Inflow'] = df['Inflow'].astype(str).str.replace(r'[^\d.]', '', regex=True)
-    df['Inflow'] = pd.to_numeric(df['Inflow'], errors='coerce')
-    df.dropna(subset=['Outflow', 'Inflow'], inplace=True)
-
-    # Convert 'Date' column to datetime objects
-    df['Date'] = pd.to_datetime(df['Date'], format='%m/%d/%Y')
-    df['Month'] = df['Date'].dt.month
-    df['Year'] = df['Date'].dt.year
+    clean_spending_frame(df)
 
     # Group spending by month and compare to monthly inflow
+    cube = SpendingCube.from_frame(df)
+    # Leave the caller's frame in dollars, the units calculate_50_30_recommendations takes
+    df['Outflow'] = df['Outflow'] / 100
+    df['Inflow'] = df['Inflow'] / 100
+    return build_monthly_summary(cube.monthly_totals(), monthly_inflow)
+
+def build_monthly_summary(totals: pd.DataFrame, monthly_inflow: float):
+    net = totals['outflow'] - totals['inflow']
+    needs = totals['needs']
+    wants = totals['wants']
+
+    # Recommendation flags for every month at once
+    if monthly_inflow > 0:
+        needs_percent = (needs / monthly_inflow) * 100
+        wants_percent = (wants / monthly_inflow) * 100
+        over_inflow = (net > monthly_inflow).tolist()
+        over_needs = (needs_percent > 50).tolist()
+        over_wants = (wants_percent > 30).tolist()
+        needs_percent = needs_percent.tolist()
+        wants_percent = wants_percent.tolist()
+
     monthly_summary = []
-    for (year, month), group in df.groupby(['Year', 'Month']):
-        month_name = pd.to_datetime(str(month), format='%m').strftime('%B')
-        total_net_spent_month = group['Outflow'].sum() - group['Inflow'].sum()
-        needs_spent_month = group[group['Category Group'] == 'Needs']['Outflow'].sum()
-        wants_spent_month = group[group['Category Group'] == 'Wants']['Outflow'].sum()
-        
-        # Calculate other_spent_month explicitly
-        other_spent_month = group[~group['Category Group'].isin(['Needs', 'Wants'])]['Outflow'].sum()
+    rows = zip(totals.index.get_level_values('Year').tolist(), totals.index.get_level_values('Month').tolist(),
+               net.tolist(), needs.tolist(), wants.tolist(), totals['other'].tolist())
+    for i, (year, month, total_net_spent_month, needs_spent_month, wants_spent_month, other_spent_month) in enumerate(rows):
+        month_name = calendar.month_name[month]
 
         month_summary = {
             "month": f"{month_name} {year}",
@@ -92,107 +155,362 @@ def process_spending_data(df: pd.DataFrame, monthly_inflow: float):
             "recommendations": []
         }
 
-        # Compare to monthly inflow
         if monthly_inflow > 0:
-            if total_net_spent_month > monthly_inflow:
+            # Compare to monthly inflow
+            if over_inflow[i]:
                 month_summary["recommendations"].append(f"Warning: In {month_name} {year}, your net spending (${total_net_spent_month:.2f}) exceeded your monthly inflow (${monthly_inflow:.2f}).")
             else:
                 month_summary["recommendations"].append(f"Info: In {month_name} {year}, your net spending (${total_net_spent_month:.2f}) was within your monthly inflow (${monthly_inflow:.2f}).")
-        else:
-            month_summary["recommendations"].append(f"Info: Monthly inflow not provided, cannot compare spending for {month_name} {year}.")
 
-        # Compare to 50/30 rule for the month
-        if monthly_inflow > 0:
-            needs_percent_month = (needs_spent_month / monthly_inflow) * 100
-            wants_percent_month = (wants_spent_month / monthly_inflow) * 100
-
-            if needs_percent_month > 50:
-                month_summary["recommendations"].append(f"Warning: In {month_name} {year}, your Needs spending was {needs_percent_month:.2f}% of your inflow, exceeding the 50% guideline.")
-            if wants_percent_month > 30:
-                month_summary["recommendations"].append(f"Warning: In {month_name} {year}, your Wants spending was {wants_percent_month:.2f}% of your inflow, exceeding the 30% guideline.")
-            
-            if needs_percent_month <= 50 and wants_percent_month <= 30:
+            # Compare to 50/30 rule for the month
+            if over_needs[i]:
+                month_summary["recommendations"].append(f"Warning: In {month_name} {year}, your Needs spending was {needs_percent[i]:.2f}% of your inflow, exceeding the 50% guideline.")
+            if over_wants[i]:
+                month_summary["recommendations"].append(f"Warning: In {month_name} {year}, your Wants spending was {wants_percent[i]:.2f}% of your inflow, exceeding the 30% guideline.")
+
+            if not over_needs[i] and not over_wants[i]:
                 month_summary["recommendations"].append(f"Info: In {month_name} {year}, your Needs and Wants spending adhered to the 50/30 rule relative to your inflow.")
         else:
+            month_summary["recommendations"].append(f"Info: Monthly inflow not provided, cannot compare spending for {month_name} {year}.")
             month_summary["recommendations"].append(f"Info: Monthly inflow not provided, cannot assess 50/30 rule for {month_name} {year}.")
 
         monthly_summary.append(month_summary)
     return monthly_summary
 
+def build_recommendations(totals: pd.DataFrame, monthly_inflow: float):
+    # Monthly summary from the per-month totals
+    monthly_summary = build_monthly_summary(totals, monthly_inflow)
+
+    # Overall recommendations (from calculate_50_30_recommendations)
+    overall_recommendations = calculate_50_30_recommendations_from_totals(totals, monthly_inflow)
+
+    # Combine monthly and overall recommendations
+    all_recommendations = []
+    for summary in monthly_summary:
+        all_recommendations.append(f"\n--- {summary['month']} ---")
+        all_recommendations.append(f"Total Net Spent: ${summary['total_net_spent']:.2f}")
+        all_recommendations.append(f"Needs Spent: ${summary['needs_spent']:.2f}")
+        all_recommendations.append(f"Wants Spent: ${summary['wants_spent']:.2f}")
+        all_recommendations.append(f"Other Spent: ${summary['other_spent']:.2f}")
+        all_recommendations.extend(summary['recommendations'])
+    
+    all_recommendations.append("\n--- Overall Recommendations ---")
+    all_recommendations.extend(overall_recommendations)
+    return all_recommendations
+
+def build_agent(df: pd.DataFrame, run_python):
+    with span("agent.build"):
+        agent = _build_agent(df)
+        # The stock tool executes the model's code in this process; swap in one that runs it in the sandbox
+        agent.tools = [create_python_tool(run_python)]
+        return agent
+
+def _build_agent(df: pd.DataFrame):
+    # Create a langchain agent
+    return create_pandas_dataframe_agent(shared_llm.get(), df, verbose=True, allow_dangerous_code=True,
+                                        agent_kwargs={
+                                            "system_message": "You are a friendly and helpful AI assistant that can answer questions about spending habits from a CSV file. The CSV file contains 'Outflow', 'Inflow', 'Category', 'Category Group', 'Date', 'Month', and 'Year' columns. 'Outflow' and 'Inflow' are whole numbers of cents, so divide them by 100 before reporting dollar amounts. When asked about dates, use the 'Date', 'Month', and 'Year' columns. Feel free to ask clarifying questions or offer further insights based on the data."
+                                        },
+                                        prefix="You are a friendly and helpful AI assistant that can analyze spending habits from a CSV file. The CSV file contains 'Outflow', 'Inflow', 'Category', 'Category Group', 'Date', 'Month', and 'Year' columns. 'Outflow' and 'Inflow' are whole numbers of cents, so divide them by 100 before reporting dollar amounts. When asked about dates, use the 'Date', 'Month', and 'Year' columns. Feel free to ask clarifying questions or offer further insights based on the data.")
+
 @app.get("/", response_class=HTMLResponse)
 async def main():
     with open("static/index.html", "r") as f:
         return HTMLResponse(content=f.read(), status_code=200)
 
 @app.post("/uploadfile/")
-async def create_upload_file(csv_file: UploadFile = File(...), monthly_inflow: float = Form(...)):
-    global df_global, monthly_inflow_global, agent, memory
+async def create_upload_file(request: Request, response: Response, csv_file: UploadFile = File(...), monthly_inflow: float = Form(...)):
     try:
         if not os.environ.get("GOOGLE_API_KEY"):
             return {"error": "GOOGLE_API_KEY environment variable not set."}
 
-        df = pd.read_csv(csv_file.file)
-        df_global = df
-        monthly_inflow_global = monthly_inflow
-        
-        # Debugging: Print DataFrame head and info
-        print("DataFrame Head:")
-        print(df.head())
-        print("\nDataFrame Info:")
-        print(df.info())
-
-        # Basic data validation
-        if 'Outflow' not in df.columns or 'Inflow' not in df.columns or 'Category' not in df.columns or 'Category Group' not in df.columns or 'Date' not in df.columns:
-            return {"error": "CSV must have 'Outflow', 'Inflow', 'Category', 'Category Group', and 'Date' columns"}
-
-        # Call the new function to process data and get monthly summary
-        monthly_summary = process_spending_data(df, monthly_inflow_global)
-
-        # Create a langchain agent
-        llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0)
-        agent = create_pandas_dataframe_agent(llm, df, verbose=True, allow_dangerous_code=True,
-                                            agent_kwargs={
-                                                "system_message": "You are a friendly and helpful AI assistant that can answer questions about spending habits from a CSV file. The CSV file contains 'Outflow', 'Category', 'Category Group', 'Date', 'Month', and 'Year' columns. When asked about dates, use the 'Date', 'Month', and 'Year' columns. Feel free to ask clarifying questions or offer further insights based on the data."
-                                            },
-                                            memory=memory,
-                                            prefix="You are a friendly and helpful AI assistant that can analyze spending habits from a CSV file. The CSV file contains 'Outflow', 'Category', 'Category Group', 'Date', 'Month', and 'Year' columns. When asked about dates, use the 'Date', 'Month', and 'Year' columns. Feel free to ask clarifying questions or offer further insights based on the data.")
-
-        # Overall recommendations (from calculate_50_30_recommendations)
-        overall_recommendations = calculate_50_30_recommendations(df, monthly_inflow_global)
-
-        # Combine monthly and overall recommendations
-        all_recommendations = []
-        for summary in monthly_summary:
-            all_recommendations.append(f"\n--- {summary['month']} ---")
-            all_recommendations.append(f"Total Net Spent: ${summary['total_net_spent']:.2f}")
-            all_recommendations.append(f"Needs Spent: ${summary['needs_spent']:.2f}")
-            all_recommendations.append(f"Wants Spent: ${summary['wants_spent']:.2f}")
-            all_recommendations.append(f"Other Spent: ${summary['other_spent']:.2f}")
-            all_recommendations.extend(summary['recommendations'])
-        
-        all_recommendations.append("\n--- Overall Recommendations ---")
-        all_recommendations.extend(overall_recommendations)
+        # Reject oversized uploads before reading any rows
+        if csv_file.size is not None and csv_file.size > UPLOAD_MAX_BYTES:
+            return {"error": f"Upload exceeds the {UPLOAD_MAX_BYTES} byte limit."}
+
+        # Repeat uploads of the same export load the cleaned frame and cube from the cache
+        with span("upload.hash"):
+            key = content_key(csv_file.file)
+        cached = upload_cache.load(key)
+        if cached is None:
+            metrics.increment("upload_cache.misses")
+            # Stream the CSV in fixed-size chunks, reading only the columns we use; a large export
+            # takes seconds, so it is parsed off the event loop
+            cube, df = await asyncio.get_running_loop().run_in_executor(None, parse_upload, csv_file.file)
+            with span("upload.cache_store"):
+                upload_cache.store(key, cube, df)
+        else:
+            metrics.increment("upload_cache.hits")
+            cube, df = cached
+        metrics.increment("rows.uploaded", len(df))
+        recommendations, trends = activate_upload(request, response, key, cube, df, monthly_inflow)
+        return {"recommendations": recommendations, "trends": trends}
 
-        return {"recommendations": all_recommendations}
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.post("/uploadfiles/")
+async def create_upload_files(request: Request, response: Response, csv_files: List[UploadFile] = File(...), monthly_inflow: float = Form(...)):
+    # Several exports (e.g. one per year or per budget) merged into one dataset
+    try:
+        if not os.environ.get("GOOGLE_API_KEY"):
+            return {"error": "GOOGLE_API_KEY environment variable not set."}
+
+        if len(csv_files) > UPLOAD_BATCH_MAX_FILES:
+            return {"error": f"Upload at most {UPLOAD_BATCH_MAX_FILES} files at once."}
+        for csv_file in csv_files:
+            if csv_file.size is not None and csv_file.size > UPLOAD_MAX_BYTES:
+                return {"error": f"{csv_file.filename}: Upload exceeds the {UPLOAD_MAX_BYTES} byte limit."}
+        if sum(csv_file.size or 0 for csv_file in csv_files) > UPLOAD_BATCH_MAX_BYTES:
+            return {"error": f"Uploads together exceed the {UPLOAD_BATCH_MAX_BYTES} byte limit."}
+
+        with span("upload.hash"):
+            keys = [content_key(csv_file.file) for csv_file in csv_files]
+        key = batch_key(keys)
+        cached = upload_cache.load(key)
+        if cached is None:
+            metrics.increment("upload_cache.misses")
+            # Each distinct file is parsed once, all of them at the same time
+            distinct = {}
+            for file_key, csv_file in zip(keys, csv_files):
+                distinct.setdefault(file_key, csv_file)
+            contents = [await csv_file.read() for csv_file in distinct.values()]
+            with span("upload.batch_parse"):
+                frames = await batch_parser.parse(contents)
+            for csv_file, frame in zip(distinct.values(), frames):
+                if isinstance(frame, Exception):
+                    return {"error": f"{csv_file.filename}: {frame}"}
+
+            # Merging and summing a large batch takes a while, so it runs off the event loop
+            df, duplicates, cube = await asyncio.get_running_loop().run_in_executor(None, merge_batch, frames)
+            metrics.increment("rows.duplicates", duplicates)
+            with span("upload.cache_store"):
+                upload_cache.store(key, cube, df)
+        else:
+            metrics.increment("upload_cache.hits")
+            cube, df = cached
+        metrics.increment("rows.uploaded", len(df))
+        recommendations, trends = activate_upload(request, response, key, cube, df, monthly_inflow)
+        return {"recommendations": recommendations, "trends": trends, "files": len(csv_files), "transactions": len(df)}
+
+    except Exception as e:
+        return {"error": str(e)}
+
+# These run on executor threads, so each is profiled on its own thread rather than in the request's profile
+
+def parse_upload(file):
+    with profiled("upload.parse"), span("upload.parse"):
+        return read_spending_csv(file)
+
+def parse_delta(file):
+    # The delta's cleaned rows, or None when it has none
+    with profiled("upload.parse_delta"), span("upload.parse"):
+        chunks = list(iter_spending_chunks(file))
+        return concat_spending_frames(chunks) if chunks else None
+
+def merge_batch(frames):
+    with profiled("upload.merge"), span("upload.dedupe"):
+        df, duplicates = dedupe_transactions(frames)
+    return df, duplicates, SpendingCube.from_frame(df)
+
+def activate_upload(request: Request, response: Response, key: str, cube: SpendingCube, df: pd.DataFrame, monthly_inflow: float):
+    """Make an upload the caller's session data and return its recommendations and trends report."""
+    session = sessions.get_or_create(request.cookies.get(SESSION_COOKIE))
+    response.set_cookie(SESSION_COOKIE, session.token, httponly=True, samesite="lax")
+
+    # Trends start from the cube's cells; later appends update them in place
+    trends = TrendEngine.from_cube(cube)
+
+    # Swap in the new data for this session only; its agent is built on the first chat that needs it
+    with session.lock:
+        if session.dataset_key != key:
+            # Figures the chat remembers came from the old data
+            session.memory.forget_figures()
+        session.df = df
+        session.cube = cube
+        session.dataset_key = key
+        session.trends = trends
+        session.aggregates = SpendingAggregates(cube, trends)
+        session.monthly_inflow = monthly_inflow
+        session.agent = None
+    sessions.update_footprint(session)
+
+    all_recommendations = upload_cache.load_recommendations(key, monthly_inflow)
+    if all_recommendations is None:
+        all_recommendations = build_recommendations(cube.monthly_totals(), monthly_inflow)
+        upload_cache.store_recommendations(key, monthly_inflow, all_recommendations)
+    return all_recommendations, trends.report()
+
+@app.post("/transactions/append")
+async def append_transactions(request: Request, csv_file: UploadFile = File(...)):
+    # Adds a delta export (e.g. yesterday's YNAB transactions) to the session's uploaded data
+    try:
+        session = sessions.get(request.cookies.get(SESSION_COOKIE))
+        if session is None or session.cube is None:
+            return {"error": "Please upload a CSV file first."}
+
+        if csv_file.size is not None and csv_file.size > UPLOAD_MAX_BYTES:
+            return {"error": f"Upload exceeds the {UPLOAD_MAX_BYTES} byte limit."}
+
+        # Parse only the new rows, then fold them into the cube's existing cells
+        delta_key = content_key(csv_file.file)
+        new_rows = await asyncio.get_running_loop().run_in_executor(None, parse_delta, csv_file.file)
+        if new_rows is None:
+            return {"appended": 0, "recommendations": build_recommendations(session.cube.monthly_totals(), session.monthly_inflow),
+                    "trends": session.trends.report()}
+        metrics.increment("rows.appended", len(new_rows))
+        with session.lock:
+            session.cube.append(new_rows)
+            session.trends.append(new_rows)
+            session.df = concat_spending_frames([session.df, new_rows])
+            session.dataset_key = hashlib.sha256(f"{session.dataset_key}+{delta_key}".encode()).hexdigest()
+            session.memory.forget_figures()
+            session.aggregates = SpendingAggregates(session.cube, session.trends)
+            session.agent = None
+            monthly_inflow = session.monthly_inflow
+            trends = session.trends.report()
+        sessions.update_footprint(session)
+
+        return {"appended": len(new_rows), "recommendations": build_recommendations(session.cube.monthly_totals(), monthly_inflow),
+                "trends": trends}
 
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/session/memory")
+async def session_memory(request: Request):
+    # Bytes held by this session's frame, per column, and by its cube
+    session = sessions.get(request.cookies.get(SESSION_COOKIE))
+    if session is None or session.df is None:
+        return {"error": "Please upload a CSV file first."}
+    with session.lock:
+        frame = memory_report(session.df)
+        cube_bytes = session.cube.nbytes if session.cube is not None else 0
+        cube_cells = session.cube.size if session.cube is not None else 0
+    return {"frame": frame, "cube": {"cells": cube_cells, "bytes": cube_bytes}, "total_bytes": frame["total_bytes"] + cube_bytes}
+
+def session_agent(session):
+    # Built on the pool thread the first time the session needs the LLM, then kept until new data arrives.
+    # The lock only guards reading and storing the session's fields: handlers on the event loop take it
+    # too, so it is never held while the agent is built or runs.
+    with session.lock:
+        agent, df, dataset = session.agent, session.df, session.dataset_key
+    if agent is None:
+        # Names the agent's snippets define carry over to its later ones, as with the stock tool
+        agent = build_agent(df, python_sandbox.session(dataset, df).run)
+        with session.lock:
+            # Data uploaded meanwhile clears the agent; this one still answers from the data it was asked about
+            if session.dataset_key == dataset:
+                session.agent = agent
+    return agent
+
+def invoke_session_agent(session, message: str):
+    # Runs on a pool thread, so it is profiled separately from the request
+    with profiled("agent.invoke"):
+        agent = session_agent(session)
+        # The agent sees earlier turns only through its input, bounded by the memory's token budget
+        with span("agent.invoke"):
+            output = agent.invoke({"input": session.memory.render(message)}, config={"callbacks": [create_llm_call_counter()]})["output"]
+        session.memory.add_turn(message, output)
+        return output
+
+def stream_session_agent(emit, session, message: str):
+    with profiled("agent.stream"):
+        agent = session_agent(session)
+        with span("agent.invoke"):
+            output = stream_agent(emit, agent, session.memory.render(message), callbacks=[create_llm_call_counter()])
+        if output is not None:
+            session.memory.add_turn(message, output)
+
+def answer_from_aggregates(session, message: str):
+    # Fast-path answers join the conversation too, and their figures are kept for the agent to reuse
+    facts = {}
+    answer = query_router.answer(session.aggregates, message, facts)
+    if answer is not None:
+        session.memory.add_turn(message, answer, fold=False)
+        session.memory.remember(facts)
+        if session.memory.pending:
+            # This runs on the event loop, and the summarizer may be a model call
+            asyncio.get_running_loop().run_in_executor(None, session.memory.fold)
+    return answer
+
+@app.get("/metrics")
+async def get_metrics():
+    # Span latencies and counters, chat routing and pool load, and memory held by each session
+    report = metrics.snapshot()
+    report["chat"] = {
+        "routes": {route: dict(stats) for route, stats in query_router.stats.items()},
+        "fast_path_hit_rate": query_router.hit_rate(),
+        "in_flight": chat_executor.in_flight,
+    }
+    report["sessions"] = {
+        "count": len(sessions),
+        "total_bytes": sessions.total_bytes,
+        "budget_bytes": sessions.memory_budget_bytes,
+        # Tokens are credentials, so sessions are listed by a short hash
+        "per_session": [{"id": hashlib.sha256(token.encode()).hexdigest()[:12], "bytes": nbytes, "idle_seconds": idle}
+                        for token, nbytes, idle in sessions.footprints()],
+    }
+    return report
+
 @app.post("/chat")
 async def chat(request: Request):
-    global agent
     data = await request.json()
     message = data.get("message")
 
-    # Debugging: Print user message
-    print(f"\nUser Message: {message}")
-
-    if agent is None:
+    session = sessions.get(request.cookies.get(SESSION_COOKIE))
+    if session is None or session.df is None:
         return {"response": "Please upload a CSV file first."}
 
-    response = agent.invoke({"input": message})["output"]
-    
-    # Debugging: Print agent response
-    print(f"Agent Response: {response}")
+    # Simple aggregate questions are answered from the precomputed totals
+    answer = answer_from_aggregates(session, message)
+    if answer is not None:
+        return {"response": answer, "route": FAST_PATH}
+
+    # The agent blocks on LLM round-trips, so it runs on the worker pool
+    start = time.perf_counter()
+    try:
+        response = await chat_executor.run(session.token, invoke_session_agent, session, message)
+    except ChatBusy as e:
+        metrics.increment("chat.busy")
+        return JSONResponse(status_code=429, content={"response": str(e)})
+    except ChatTimeout as e:
+        metrics.increment("chat.timeouts")
+        return JSONResponse(status_code=504, content={"response": str(e)})
+    query_router.record(AGENT, time.perf_counter() - start)
+
+    return {"response": response, "route": AGENT}
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request):
+    data = await request.json()
+    message = data.get("message")
 
-    return {"response": response}
\ No newline at end of file
+    session = sessions.get(request.cookies.get(SESSION_COOKIE))
+    if session is None or session.df is None:
+        async def upload_first():
+            yield format_sse("final", "Please upload a CSV file first.")
+        return StreamingResponse(upload_first(), media_type="text/event-stream")
+
+    answer = answer_from_aggregates(session, message)
+    if answer is not None:
+        async def fast_path():
+            yield format_sse("route", FAST_PATH)
+            yield format_sse("final", answer)
+        return StreamingResponse(fast_path(), media_type="text/event-stream")
+
+    start = time.perf_counter()
+    try:
+        events = chat_executor.stream(session.token, stream_session_agent, session, message)
+    except ChatBusy as e:
+        metrics.increment("chat.busy")
+        return JSONResponse(status_code=429, content={"response": str(e)})
+
+    async def server_sent_events():
+        yield format_sse("route", AGENT)
+        async for event, payload in events:
+            yield format_sse(event, payload)
+        query_router.record(AGENT, time.perf_counter() - start)
+
+    return StreamingResponse(server_sent_events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,66 @@
+import re
+import numpy as np
+import pandas as pd
+
+# A YNAB amount: an optional sign or accounting parentheses around an optional "$" and a number
+# whose thousands separators, if any, sit every three digits ("$1,234.56", "-$12.00", "($12.00)")
+_AMOUNT = re.compile(r'^(?P<open>\()?(?P<sign>[-+])?\$?\s*(?P<inner_sign>[-+])?'
+                     r'(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d*)?|\d+(?:\.\d*)?|\.\d+)(?P<close>\))?$')
+
+
+def _parse_amounts(texts: pd.Series) -> np.ndarray:
+    # Parse distinct amount strings to cents as float64, NaN where a string isn't an amount.
+    # Nearly every amount has the plain "$1,234.56" shape, which is checked and parsed with
+    # vectorized string methods; only the rest (signs, parentheses, rejects) go through _AMOUNT.
+    texts = texts.str.replace('\u00a0', ' ', regex=False).str.strip()
+    body = texts.str.removeprefix('$')
+    digits = body.str.replace(',', '', regex=False)
+    integer = digits.str.slice(0, -3)
+    length = integer.str.len().to_numpy(dtype=float)
+    commas = body.str.len().to_numpy(dtype=float) - digits.str.len().to_numpy(dtype=float)
+    plain = ((digits.str.slice(-3, -2) == '.') & integer.str.isdigit() & digits.str.slice(-2).str.isdigit()).to_numpy(dtype=bool)
+    # Separators, if any, sit every three digits from the decimal point
+    plain = plain & ((commas == 0) | (commas == (length - 1) // 3))
+    for group in range(1, int(np.nanmax(commas, initial=0)) + 1):
+        plain = plain & ((commas < group) | (body.str.get(-3 - 4 * group) == ',').to_numpy(dtype=bool))
+    cents = np.rint(pd.to_numeric(digits.where(plain), errors='coerce').to_numpy(dtype=float) * 100)
+
+    rest = ~plain
+    if rest.any():
+        cents[rest] = _parse_unusual_amounts(texts[rest])
+    return cents
+
+
+def _parse_unusual_amounts(texts: pd.Series) -> np.ndarray:
+    parts = texts.str.extract(_AMOUNT)
+    # Parentheses only count as a pair, and only one sign is allowed
+    valid = (parts['open'].notna() == parts['close'].notna()) & ~(parts['sign'].notna() & parts['inner_sign'].notna())
+    negative = ((parts['sign'] == '-') | (parts['inner_sign'] == '-') | parts['open'].notna()).to_numpy(dtype=bool)
+    digits = parts['number'].str.replace(',', '', regex=False).where(valid)
+    amounts = pd.to_numeric(digits, errors='coerce').to_numpy(dtype=float)
+    cents = np.rint(amounts * 100)
+    return np.where(negative, -cents, cents)
+
+
+def parse_currency_cents(values: pd.Series) -> pd.Series:
+    """Parse YNAB currency strings to integer cents (nullable Int64, NA where unparseable).
+
+    Each distinct string is parsed once; exports repeat amounts such as "$0.00" heavily.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.Series(np.rint(values.to_numpy(dtype=float) * 100), index=values.index).astype('Int64')
+
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    parsed = _parse_amounts(pd.Series(uniques, dtype=object).astype(str))
+    # Append a NaN slot so missing values (code -1) map to NA
+    parsed = np.append(parsed, np.nan)
+    return pd.Series(parsed[codes], index=values.index).astype('Int64')
+
+
+def parse_dates(values: pd.Series, format: str = '%m/%d/%Y') -> pd.Series:
+    """Parse date strings, converting each distinct string only once."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    parsed = pd.to_datetime(pd.Index(uniques), format=format)
+    return pd.Series(parsed.take(codes, allow_fill=True, fill_value=pd.NaT), index=values.index)
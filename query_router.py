@@ -0,0 +1,333 @@
+import calendar
+import re
+import threading
+import time
+import numpy as np
+import pandas as pd
+from cube import SpendingCube
+from trends import TOTALS, ROLLING_WINDOWS
+
+FAST_PATH = "fast_path"
+AGENT = "agent"
+
+# Dimensions a question can name, most specific first
+DIMENSIONS = ['Category', 'Category Group', 'Payee']
+RANKING_WORDS = {
+    'payee': 'Payee', 'payees': 'Payee', 'merchant': 'Payee', 'merchants': 'Payee', 'store': 'Payee', 'stores': 'Payee',
+    'category': 'Category', 'categories': 'Category',
+    'group': 'Category Group', 'groups': 'Category Group', 'category group': 'Category Group', 'category groups': 'Category Group',
+}
+PLURALS = {'Payee': 'payees', 'Category': 'categories', 'Category Group': 'category groups'}
+
+_MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+_MONTHS['sept'] = 9
+_MONTH_PATTERN = '|'.join(sorted(_MONTHS, key=len, reverse=True))
+# "may" on its own is too often the verb, so it needs a preposition or a year
+_PERIOD = re.compile(r'\b(this month|last month|previous month)\b|'
+                     rf'(?:\b(in|of|during|for|from|to|vs|versus|and|than)\s+)?\b({_MONTH_PATTERN})\b(?:\s+(\d{{4}}))?')
+_TOP = re.compile(r'\b(?:top|biggest|largest)\s+(\d+)?\s*(category groups?|categories|category|groups?|payees?|merchants?|stores?)\b')
+_COMPARE = re.compile(r'\b(compare|compared|change|changed|vs|versus|month over month|month-over-month|difference)\b')
+_SPEND = re.compile(r'\b(how much|total|what did (?:i|we) spend|(?:what was|how (?:did|has)) (?:my|our) spending|compare)\b')
+# Questions asking for judgement, advice or other measures than outflow go to the agent
+_OPEN_ENDED = re.compile(r'\b(why|should|could|would|advice|advise|recommend|suggest|tips?|reduce|cut|save|saved|savings|'
+                         r'budget|income|inflow|earn|earned|average|per day|predict|forecast|trend)\b')
+# Trend questions the TrendEngine answers; advice about them still goes to the agent
+_ADVICE = re.compile(r'\b(why|should|could|would|advice|advise|recommend|suggest|tips?|reduce|cut|save|budget|predict|forecast)\b')
+_AVERAGE = re.compile(r'\b(average|averages|avg|typical|rolling)\b')
+_WINDOW = re.compile(r'\b(3|6|12|three|six|twelve) months?\b')
+_WINDOW_WORDS = {'3': 3, '6': 6, '12': 12, 'three': 3, 'six': 6, 'twelve': 12}
+_INFLOW = re.compile(r'\b(income|inflow|inflows|earn|earned)\b')
+_ANOMALY = re.compile(r'\b(anomal\w*|spikes?|outliers?|unusual (?:spending|months?))\b')
+_ENTITY = re.compile(r'\b(?:on|at|for|compare)\s+(.+?)(?=\s+(?:in|during|for|from|this|last|compare|compared|change|changed|vs|versus|and|between|month)\b|$)')
+# Words a question may use around the parts the router parses; anything else (another name, a year,
+# "and", "how many", "refunds") means the question asks for more than the answer would give
+_FILLER = frozenset("""
+    how much did do does i we my our me what what's whats was is were have has had the a in during any
+    spend spent spending total money expenses purchases show tell give list please overall all everything
+    compare compared vs versus change changed difference month over by
+    average averages avg typical rolling monthly income inflow earn earned
+""".split())
+
+
+def _normalize(name) -> str:
+    # Lowercase alphanumerics only, so "🛒 Groceries" matches "groceries"
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', str(name).lower()).split())
+
+
+def format_amount(cents: int) -> str:
+    sign = '-' if cents < 0 else ''
+    return f"{sign}${abs(cents) / 100:,.2f}"
+
+
+def period_label(period: int) -> str:
+    return f"{calendar.month_name[period % 12 + 1]} {period // 12}"
+
+
+class SpendingAggregates:
+    """Outflow totals per month and per category, group and payee, read from the upload's SpendingCube."""
+
+    def __init__(self, cube: SpendingCube, trends=None):
+        # The session's TrendEngine, for rolling averages, inflow and anomalies
+        self.trends = trends
+        cells = cube.to_frame()
+        frame = pd.DataFrame({'period': cells['Year'].to_numpy(dtype=np.int64) * 12 + cells['Month'].to_numpy(dtype=np.int64) - 1,
+                              'outflow': cells['outflow'].to_numpy()})
+        self.dimensions = [dimension for dimension in DIMENSIONS if cells[dimension].notna().any()]
+        for dimension in self.dimensions:
+            frame[dimension] = cells[dimension]
+
+        self.periods = sorted(frame['period'].unique().tolist())
+        self.month_totals = frame.groupby('period')['outflow'].sum().to_dict()
+        self.totals = {}
+        self.names = {}
+        for dimension in self.dimensions:
+            by_name = frame.groupby([dimension, 'period'], observed=True)['outflow'].sum()
+            self.totals[dimension] = by_name.to_dict()
+            for name in by_name.index.get_level_values(0).unique():
+                self.names.setdefault(_normalize(name), (dimension, name))
+        self._rankings = {}
+
+    def total(self, dimension: str = None, name=None, periods=None) -> int:
+        periods = self.periods if periods is None else periods
+        if dimension is None:
+            return sum(self.month_totals.get(period, 0) for period in periods)
+        totals = self.totals[dimension]
+        return sum(totals.get((name, period), 0) for period in periods)
+
+    def ranking(self, dimension: str, period: int = None):
+        # Largest outflows first, computed once per (dimension, period)
+        key = (dimension, period)
+        if key not in self._rankings:
+            sums = {}
+            for (name, row_period), cents in self.totals[dimension].items():
+                if period is None or row_period == period:
+                    sums[name] = sums.get(name, 0) + cents
+            self._rankings[key] = sorted(((cents, name) for name, cents in sums.items() if cents > 0), reverse=True)
+        return self._rankings[key]
+
+    def resolve(self, text: str):
+        """Find the category, group or payee a phrase names: exact match first, then a unique partial match."""
+        wanted = _normalize(text)
+        if not wanted:
+            return None
+        if wanted in self.names:
+            return self.names[wanted]
+        if wanted.endswith('s') and wanted[:-1] in self.names:
+            return self.names[wanted[:-1]]
+        partial = [match for normalized, match in self.names.items() if wanted in normalized.split() or
+                   (len(wanted) > 3 and wanted in normalized)]
+        for dimension in self.dimensions:
+            candidates = [match for match in partial if match[0] == dimension]
+            if len(candidates) == 1:
+                return candidates[0]
+            if candidates:
+                return None
+        return None
+
+
+class QueryRouter:
+    """Answers common aggregate questions from SpendingAggregates and counts which path served each one."""
+
+    def __init__(self):
+        self.stats = {FAST_PATH: {"count": 0, "seconds": 0.0}, AGENT: {"count": 0, "seconds": 0.0}}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, seconds: float):
+        with self._lock:
+            self.stats[route]["count"] += 1
+            self.stats[route]["seconds"] += seconds
+
+    def hit_rate(self) -> float:
+        total = self.stats[FAST_PATH]["count"] + self.stats[AGENT]["count"]
+        return self.stats[FAST_PATH]["count"] / total if total else 0.0
+
+    def answer(self, aggregates: SpendingAggregates, message: str, facts: dict = None):
+        """Return a direct answer, or None when the question needs the agent.
+
+        When facts is given, each figure in the answer is also added to it by label.
+        """
+        if aggregates is None or not message or not aggregates.periods:
+            return None
+        start = time.perf_counter()
+        answer = answer_query(aggregates, message, facts)
+        if answer is not None:
+            self.record(FAST_PATH, time.perf_counter() - start)
+        return answer
+
+
+def _parse_periods(aggregates: SpendingAggregates, text: str):
+    periods = []
+    latest = aggregates.periods[-1]
+    for relative, preposition, month, year in _PERIOD.findall(text):
+        if relative == 'this month':
+            periods.append(latest)
+        elif relative:
+            periods.append(latest - 1)
+        elif month:
+            if month == 'may' and not preposition and not year:
+                continue
+            number = _MONTHS[month] - 1
+            if year:
+                periods.append(int(year) * 12 + number)
+            else:
+                # Without a year, the most recent such month in the data
+                matches = [period for period in aggregates.periods if period % 12 == number]
+                if not matches:
+                    return None
+                periods.append(matches[-1])
+    return periods
+
+
+def _strip_periods(text: str) -> str:
+    return _PERIOD.sub(lambda match: ' ' if match.group(1) or match.group(3) else match.group(0), text)
+
+
+def _consumed(text: str, *patterns) -> bool:
+    """Whether the periods, the entity phrase and the patterns' matches account for every word but filler."""
+    rest = ' '.join(_strip_periods(text).split())
+    for pattern in (_ENTITY,) + patterns:
+        rest = pattern.sub(' ', rest)
+    return all(word in _FILLER for word in rest.split())
+
+
+def _entity(aggregates: SpendingAggregates, text: str):
+    """The (dimension, name) a question is about; (None, None) for all spending, or None when it can't be resolved."""
+    match = _ENTITY.search(_strip_periods(text).strip())
+    if not match:
+        return None, None
+    phrase = re.sub(r'^(my|the|our)\s+', '', match.group(1).strip())
+    phrase = re.sub(r'\s+(spending|expenses|purchases)$', '', phrase)
+    if phrase in ('everything', 'all', 'total', 'spending'):
+        return None, None
+    return aggregates.resolve(phrase)
+
+
+def _windows(averages: dict, windows) -> str:
+    return ", ".join(f"{format_amount(round(averages[window]))} over {window} months" for window in windows)
+
+
+def answer_trend_query(aggregates: SpendingAggregates, text: str, periods, facts: dict):
+    trends = aggregates.trends
+    if trends is None or not trends.months or _ADVICE.search(text):
+        return None
+    if not _consumed(text, _WINDOW, _AVERAGE, _INFLOW, _ANOMALY):
+        return None
+
+    if _ANOMALY.search(text):
+        anomalies = trends.anomalies()
+        if not anomalies:
+            return "No unusual spending in the last 12 months."
+        lines = ["Unusual spending in the last 12 months:"]
+        for anomaly in anomalies[:5]:
+            lines.append(f"- {anomaly['name']} in {anomaly['month']}: ${anomaly['spent']:,.2f}, "
+                         f"against a typical ${anomaly['typical']:,.2f}")
+            facts[f"Spending on {anomaly['name']} in {anomaly['month']}"] = f"${anomaly['spent']:,.2f}"
+        return "\n".join(lines)
+
+    window = _WINDOW.search(text)
+    windows = [_WINDOW_WORDS[window.group(1)]] if window else list(ROLLING_WINDOWS)
+    if window and windows[0] not in ROLLING_WINDOWS:
+        return None
+    end = periods[0] if len(periods) == 1 else None
+    if periods and end is None:
+        return None
+    as_of = period_label(end if end is not None else trends.latest)
+
+    if _INFLOW.search(text):
+        averages = trends.averages(TOTALS, 'inflow', end)
+        if _AVERAGE.search(text) or window:
+            available = [window for window in windows if averages[window] is not None]
+            if not available:
+                return None
+            for window in available:
+                facts[f"Average monthly inflow over {window} months to {as_of}"] = format_amount(round(averages[window]))
+            return f"Your average monthly inflow to {as_of} was {_windows(averages, available)}."
+        if not _SPEND.search(text) and not re.search(r'\bwhat\b', text):
+            return None
+        column = (end if end is not None else trends.latest) - trends.start
+        if column < 0:
+            return None
+        cents = int(trends.monthly(TOTALS, 'inflow')[column])
+        facts[f"Inflow in {as_of}"] = format_amount(cents)
+        return f"Your inflow was {format_amount(cents)} in {as_of}."
+
+    if not _AVERAGE.search(text):
+        return None
+    entity = _entity(aggregates, text)
+    if entity is None:
+        return None
+    dimension, name = entity
+    if dimension is None:
+        dimension, name = TOTALS, 'outflow'
+    elif dimension not in trends.tables:
+        return None
+    averages = trends.averages(dimension, name, end)
+    available = [window for window in windows if averages[window] is not None]
+    if not available:
+        return None
+    subject = f" on {name}" if dimension != TOTALS else ""
+    for window in available:
+        facts[f"Average monthly spending{subject} over {window} months to {as_of}"] = format_amount(round(averages[window]))
+    return f"Your average monthly spending{subject} to {as_of} was {_windows(averages, available)}."
+
+
+def answer_query(aggregates: SpendingAggregates, message: str, facts: dict = None):
+    facts = {} if facts is None else facts
+    text = ' '.join(message.lower().replace('?', ' ').replace('-', ' ').split())
+    periods = _parse_periods(aggregates, text)
+    if periods is None:
+        return None
+    trend = answer_trend_query(aggregates, text, periods, facts)
+    if trend is not None:
+        return trend
+    if _OPEN_ENDED.search(text):
+        return None
+
+    top = _TOP.search(text)
+    if top:
+        dimension = RANKING_WORDS[top.group(2)]
+        if dimension not in aggregates.dimensions or len(periods) > 1 or not _consumed(text, _TOP):
+            return None
+        limit = int(top.group(1) or 5)
+        period = periods[0] if periods else None
+        ranking = aggregates.ranking(dimension, period)[:limit]
+        scope = f"in {period_label(period)}" if period is not None else "overall"
+        if not ranking:
+            return f"No spending found {scope}."
+        lines = [f"Top {len(ranking)} {PLURALS[dimension]} by spending {scope}:"]
+        lines += [f"{rank}. {name}: {format_amount(cents)}" for rank, (cents, name) in enumerate(ranking, start=1)]
+        facts.update((f"Spending on {name} {scope}", format_amount(cents)) for cents, name in ranking)
+        return "\n".join(lines)
+
+    if not _SPEND.search(text) or not _consumed(text):
+        return None
+
+    entity = _entity(aggregates, text)
+    if entity is None:
+        return None
+    dimension, name = entity
+    subject = f" on {name}" if name is not None else ""
+
+    if _COMPARE.search(text):
+        if len(periods) == 1:
+            periods = [periods[0] - 1, periods[0]]
+        if len(periods) != 2:
+            return None
+        before, after = sorted(periods)
+        before_cents = aggregates.total(dimension, name, [before])
+        after_cents = aggregates.total(dimension, name, [after])
+        delta = after_cents - before_cents
+        direction = "up" if delta > 0 else "down" if delta < 0 else "unchanged"
+        percent = f" ({delta / before_cents * 100:+.1f}%)" if before_cents else ""
+        facts[f"Spending{subject} in {period_label(before)}"] = format_amount(before_cents)
+        facts[f"Spending{subject} in {period_label(after)}"] = format_amount(after_cents)
+        return (f"Spending{subject} was {format_amount(before_cents)} in {period_label(before)} and "
+                f"{format_amount(after_cents)} in {period_label(after)}: {direction} {format_amount(abs(delta))}{percent}.")
+
+    if len(periods) > 1:
+        return None
+    scope = f" in {period_label(periods[0])}" if periods else " across all months"
+    cents = aggregates.total(dimension, name, periods or None)
+    facts[f"Spending{subject}{scope}"] = format_amount(cents)
+    return f"You spent {format_amount(cents)}{subject}{scope}."
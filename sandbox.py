@@ -0,0 +1,377 @@
+import ast
+import contextlib
+import io
+import math
+import multiprocessing
+import os
+import re
+import shutil
+import signal
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+from instrumentation import metrics, span
+from upload_cache import save_frame, load_frame
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; snippets then run without CPU and memory limits
+    resource = None
+
+# Limits for the agent's Python tool, overridable per deployment
+SANDBOX_WORKERS = int(os.environ.get("SANDBOX_WORKERS", 2))
+SANDBOX_CPU_SECONDS = int(os.environ.get("SANDBOX_CPU_SECONDS", 10))
+SANDBOX_MEMORY_BYTES = int(os.environ.get("SANDBOX_MEMORY_BYTES", 1024 * 1024 * 1024))
+SANDBOX_TIMEOUT_SECONDS = float(os.environ.get("SANDBOX_TIMEOUT_SECONDS", 30))
+SANDBOX_CACHE_ENTRIES = int(os.environ.get("SANDBOX_CACHE_ENTRIES", 512))
+SANDBOX_DIR = os.environ.get("SANDBOX_DIR", ".sandbox_frames")
+# Published frames kept on disk; each session's current data is one
+SANDBOX_MAX_DATASETS = int(os.environ.get("SANDBOX_MAX_DATASETS", 32))
+# Tool output goes back into the prompt, so it is cut off like a notebook would
+SANDBOX_MAX_OUTPUT_CHARS = int(os.environ.get("SANDBOX_MAX_OUTPUT_CHARS", 4000))
+# Earlier snippets an agent's Python state is rebuilt from; each is run again before every new snippet
+SANDBOX_HISTORY_SNIPPETS = int(os.environ.get("SANDBOX_HISTORY_SNIPPETS", 20))
+
+
+class SnippetLimitExceeded(Exception):
+    pass
+
+
+class FrameUnavailable(Exception):
+    """A worker could not load a published frame; not something the snippet did."""
+
+
+class FrameEvicted(FrameUnavailable):
+    """The published frame was removed before the worker loaded it."""
+
+
+def sanitize_snippet(code: str) -> str:
+    # Models often wrap code in a markdown fence; strip it like the stock pandas agent tool does
+    code = re.sub(r"^(\s|`)*(?i:python)?\s*", "", code)
+    return re.sub(r"(\s|`)*$", "", code)
+
+
+def _names(code: str, context) -> set:
+    # Names a snippet binds (context ast.Store) or reads (ast.Load); a snippet that doesn't parse has neither
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return set()
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, context):
+            names.add(node.id)
+        elif context is ast.Store and isinstance(node, (ast.Subscript, ast.Attribute)) and isinstance(node.ctx, ast.Store):
+            # Assigning into an object, like df["Share"] = ..., changes what its name refers to
+            while isinstance(node, (ast.Subscript, ast.Attribute)):
+                node = node.value
+            if isinstance(node, ast.Name):
+                names.add(node.id)
+        elif context is ast.Store and isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif context is ast.Store and isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+    return names
+
+
+# Frames this worker has mapped, by published directory, with their size on disk; a worker
+# serves a few sessions at a time
+_frames = OrderedDict()
+_WORKER_FRAMES = 4
+# The address-space limit before any frame is mapped, and the hard limit it can't pass
+_address_space = None
+
+
+def _cpu_exceeded(signum, frame):
+    raise SnippetLimitExceeded("CPU time limit exceeded")
+
+
+def _start_worker(memory_bytes: int, pids):
+    # Runs once in each worker process. The address-space limit counts from the interpreter's
+    # size after pandas is imported, so memory_bytes is what a snippet itself may allocate.
+    # The pid goes back to the server, which kills the worker if a snippet outlives its timeout,
+    # and only once the worker is set up, so the server can tell a failed start from a breach.
+    global _address_space
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _cpu_exceeded)
+        with open("/proc/self/statm") as f:
+            baseline = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        _address_space = (baseline + memory_bytes, hard)
+        _reserve_address_space(0)
+    pids.put(os.getpid())
+
+
+def _reserve_address_space(extra: int):
+    # Mapped frames take address space without being the snippet's allocations, so the limit
+    # grows by the size of each mapped frame, plus extra for one about to be mapped
+    if _address_space is None:
+        return
+    base, hard = _address_space
+    soft = base + extra + sum(nbytes for _, nbytes in _frames.values())
+    resource.setrlimit(resource.RLIMIT_AS, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+
+
+def _worker_frame(directory: str) -> pd.DataFrame:
+    if directory not in _frames:
+        try:
+            nbytes = sum(entry.stat().st_size for entry in os.scandir(directory))
+            _reserve_address_space(nbytes)
+            frame = load_frame(directory)
+        except FileNotFoundError as e:
+            raise FrameEvicted(str(e)) from None
+        except (MemoryError, OSError) as e:
+            _reserve_address_space(0)
+            raise FrameUnavailable(f"{type(e).__name__}: {e}") from None
+        _frames[directory] = (frame, nbytes)
+        while len(_frames) > _WORKER_FRAMES:
+            _frames.popitem(last=False)
+        _reserve_address_space(0)
+    _frames.move_to_end(directory)
+    return _frames[directory][0]
+
+
+def _execute(code: str, namespace: dict):
+    # Run code in namespace and return the value of its last line, if that is an expression
+    tree = ast.parse(code)
+    body, last = tree.body[:-1], tree.body[-1:]
+    exec(compile(ast.Module(body, type_ignores=[]), "<snippet>", "exec"), namespace)
+    if last and isinstance(last[0], ast.Expr):
+        return eval(compile(ast.Expression(last[0].value), "<snippet>", "eval"), namespace)
+    exec(compile(ast.Module(last, type_ignores=[]), "<snippet>", "exec"), namespace)
+    return None
+
+
+def _run_snippet(directory: str, history, code: str, cpu_seconds: int):
+    """Execute one snippet against a published frame; runs in a worker process.
+
+    The snippets in history run first, silently, to rebuild the names they defined. Returns
+    what the snippet printed followed by the value of its last expression, or the error it
+    raised, as the stock pandas agent tool would, and whether it ran without error. A frame
+    that can't be loaded raises FrameUnavailable instead, since that is the server's problem,
+    not the snippet's.
+    """
+    if resource is not None:
+        # RLIMIT_CPU counts the worker's whole life, so each snippet gets its allowance on top of
+        # what earlier snippets used. Only the soft limit moves, since a lowered hard limit can't be
+        # raised again; a snippet stuck in C code that never sees SIGXCPU is caught by the timeout.
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = math.ceil(usage.ru_utime + usage.ru_stime) + cpu_seconds
+        resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+    printed = io.StringIO()
+    try:
+        frame = _worker_frame(directory)
+        # A shallow copy, so columns a snippet adds don't leak into the next one; the mapped data is shared
+        namespace = {"df": frame.copy(deep=False), "pd": pd, "np": np}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for earlier in history:
+                _execute(earlier, namespace)
+        with contextlib.redirect_stdout(printed):
+            value = _execute(code, namespace)
+        output = printed.getvalue() + ("" if value is None else str(value))
+        ok = True
+    except (SnippetLimitExceeded, FrameUnavailable):
+        raise
+    except MemoryError:
+        raise SnippetLimitExceeded("memory limit exceeded")
+    except Exception as e:
+        output = f"{type(e).__name__}: {e}"
+        ok = False
+    finally:
+        if resource is not None:
+            resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+    if len(output) > SANDBOX_MAX_OUTPUT_CHARS:
+        output = output[:SANDBOX_MAX_OUTPUT_CHARS] + "\n... (output truncated)"
+    return output, ok
+
+
+class PythonSession:
+    """One agent's Python state, kept across its tool calls like the stock tool's locals.
+
+    Worker processes are shared, so the state isn't kept in one: snippets that ran cleanly and
+    bound names are recorded, and replayed before a later snippet that reads one of those
+    names. A snippet that reads none runs, and is memoized, on its own. Only the last
+    max_snippets are kept, bounding what a replay costs.
+    """
+
+    def __init__(self, sandbox: "PythonSandbox", dataset: str, frame: pd.DataFrame, max_snippets: int = None):
+        self.sandbox = sandbox
+        self.dataset = dataset
+        self.frame = frame
+        self.max_snippets = max_snippets or SANDBOX_HISTORY_SNIPPETS
+        self.history = []
+        self._bound = set()
+        self._lock = threading.Lock()
+
+    def run(self, code: str) -> str:
+        code = sanitize_snippet(code)
+        with self._lock:
+            history = tuple(self.history) if _names(code, ast.Load) & self._bound else ()
+        output, ok = self.sandbox.execute(self.dataset, self.frame, code, history)
+        bound = _names(code, ast.Store)
+        if ok and bound:
+            with self._lock:
+                self.history.append(code)
+                del self.history[:-self.max_snippets]
+                self._bound = set().union(*(_names(earlier, ast.Store) for earlier in self.history))
+        return output
+
+
+class PythonSandbox:
+    """Runs the agent's pandas snippets in worker processes instead of the server.
+
+    Each dataset version is published once as memory-mapped .npy columns, so workers share
+    one read-only copy of the session frame and a snippet can't modify the session's data.
+    Snippets run under a CPU-time and an address-space limit plus a wall-clock timeout, and
+    successful results are memoized by (dataset version, earlier snippets, snippet), so a
+    repeated analysis never reaches a worker. A snippet past its timeout takes the pool down
+    with it; snippets from other sessions caught in that are run again on a fresh pool. This
+    bounds what a snippet can cost the server; it is not a security boundary.
+    """
+
+    def __init__(self, directory: str = None, max_workers: int = None, cpu_seconds: int = None,
+                 memory_bytes: int = None, timeout: float = None, cache_entries: int = None):
+        self.directory = directory or SANDBOX_DIR
+        self.max_workers = max_workers or SANDBOX_WORKERS
+        self.cpu_seconds = cpu_seconds or SANDBOX_CPU_SECONDS
+        self.memory_bytes = memory_bytes or SANDBOX_MEMORY_BYTES
+        self.timeout = timeout or SANDBOX_TIMEOUT_SECONDS
+        self.cache_entries = cache_entries or SANDBOX_CACHE_ENTRIES
+        self._results = OrderedDict()
+        self._pool = None
+        # Each pool's queue of pids its workers report once started, the pids read from it so
+        # far, and the pools killed after a timeout
+        self._pids = weakref.WeakKeyDictionary()
+        self._started = weakref.WeakKeyDictionary()
+        self._killed = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Started on first use; spawn rather than fork, since the app process runs threads
+        with self._lock:
+            if self._pool is None:
+                context = multiprocessing.get_context("spawn")
+                pids = context.SimpleQueue()
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                                 initializer=_start_worker, initargs=(self.memory_bytes, pids))
+                self._pids[self._pool] = pids
+                self._started[self._pool] = set()
+            return self._pool
+
+    def _worker_pids(self, pool: ProcessPoolExecutor) -> set:
+        # Pids of the pool's workers that finished starting
+        with self._lock:
+            pids, started = self._pids.get(pool), self._started.get(pool, set())
+            while pids is not None and not pids.empty():
+                started.add(pids.get())
+            return set(started)
+
+    def _discard_pool(self, pool: ProcessPoolExecutor, kill: bool = False):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        if kill:
+            # A snippet past its timeout is still running; its worker has to go with it, and
+            # there is no telling which worker that is
+            self._killed.add(pool)
+            for pid in self._worker_pids(pool):
+                with contextlib.suppress(ProcessLookupError):
+                    os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def publish(self, dataset: str, frame: pd.DataFrame) -> str:
+        """Write a dataset version for the workers once and return its directory."""
+        path = os.path.join(self.directory, dataset)
+        with self._publish_lock:
+            if os.path.isdir(path):
+                os.utime(path)
+                return path
+            os.makedirs(self.directory, exist_ok=True)
+            staging = tempfile.mkdtemp(dir=self.directory, prefix=".staging-")
+            save_frame(staging, frame)
+            os.replace(staging, path)
+            self._evict()
+        return path
+
+    def _evict(self):
+        published = sorted((os.stat(os.path.join(self.directory, name)).st_mtime, name)
+                           for name in os.listdir(self.directory) if not name.startswith("."))
+        # Workers that have a removed frame mapped keep reading it until they drop it
+        for _, name in published[:-SANDBOX_MAX_DATASETS]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def session(self, dataset: str, frame: pd.DataFrame) -> PythonSession:
+        """A Python state for one agent over frame, whose contents dataset names uniquely."""
+        return PythonSession(self, dataset, frame)
+
+    def run(self, dataset: str, frame: pd.DataFrame, code: str) -> str:
+        """Result of running code on its own against frame, whose contents dataset names uniquely."""
+        return self.execute(dataset, frame, sanitize_snippet(code))[0]
+
+    def execute(self, dataset: str, frame: pd.DataFrame, code: str, history=()):
+        """Run code after the snippets in history; returns its output and whether it ran without error."""
+        key = (dataset, history, code)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                metrics.increment("sandbox.cache_hits")
+                return self._results[key], True
+        metrics.increment("sandbox.cache_misses")
+
+        with span("agent.python"):
+            # A second attempt is made only when the first failed for a reason outside the snippet
+            for attempt in range(2):
+                directory = self.publish(dataset, frame)
+                pool = self._get_pool()
+                future = pool.submit(_run_snippet, directory, history, code, self.cpu_seconds)
+                try:
+                    output, ok = future.result(timeout=self.timeout)
+                    break
+                except FutureTimeout:
+                    metrics.increment("sandbox.limit_exceeded")
+                    self._discard_pool(pool, kill=True)
+                    return f"Error: the code did not finish within {self.timeout:g} seconds.", False
+                except SnippetLimitExceeded as e:
+                    metrics.increment("sandbox.limit_exceeded")
+                    return f"Error: {e}; try a cheaper approach.", False
+                except BrokenProcessPool:
+                    self._discard_pool(pool)
+                    if pool in self._killed and attempt == 0:
+                        # Stopped by another snippet's timeout rather than its own limits
+                        continue
+                    if not self._worker_pids(pool):
+                        # No worker got as far as reporting in, so the snippet never ran
+                        metrics.increment("sandbox.start_failures")
+                        return "Error: the Python sandbox could not start; try again later.", False
+                    # The worker was killed at its hard limit; the next snippet gets a fresh pool
+                    metrics.increment("sandbox.limit_exceeded")
+                    return "Error: the code exceeded its CPU or memory limit and was stopped.", False
+                except FrameEvicted:
+                    # The dataset was evicted before the worker loaded it; publishing again restores it
+                    if attempt == 0:
+                        continue
+                    metrics.increment("sandbox.frame_errors")
+                    return "Error: the data could not be loaded for the code; try again later.", False
+                except FrameUnavailable as e:
+                    metrics.increment("sandbox.frame_errors")
+                    return f"Error: the data could not be loaded for the code ({e}); try again later.", False
+
+        if ok:
+            with self._lock:
+                self._results[key] = output
+                while len(self._results) > self.cache_entries:
+                    self._results.popitem(last=False)
+        return output, ok
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,130 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_COOKIE = "session_id"
+
+# Session store limits, overridable per deployment
+SESSION_MEMORY_BUDGET_BYTES = int(os.environ.get("SESSION_MEMORY_BUDGET_BYTES", 2 * 1024 * 1024 * 1024))
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", 60 * 60))
+SESSION_MAX_COUNT = int(os.environ.get("SESSION_MAX_COUNT", 1000))
+
+
+class Session:
+    """One user's uploaded data, agent and chat memory."""
+
+    def __init__(self, token: str, memory=None):
+        self.token = token
+        self.df = None
+        self.cube = None
+        # Names the data exactly: the upload's content key, chained with each appended export's
+        self.dataset_key = None
+        self.trends = None
+        self.aggregates = None
+        self.monthly_inflow = 0
+        self.agent = None
+        self.memory = memory
+        self.nbytes = 0
+        self.last_access = time.monotonic()
+        # Held while the session's data is swapped or read by a request
+        self.lock = threading.RLock()
+
+    def footprint(self) -> int:
+        nbytes = 0
+        if self.df is not None:
+            nbytes += int(self.df.memory_usage(deep=True).sum())
+        if self.cube is not None:
+            nbytes += self.cube.nbytes
+        if self.trends is not None:
+            nbytes += self.trends.nbytes
+        return nbytes
+
+
+class SessionStore:
+    """Sessions keyed by token, evicted least-recently-used by memory budget, count and TTL."""
+
+    def __init__(self, memory_factory=None, memory_budget_bytes: int = None, ttl_seconds: float = None,
+                 max_sessions: int = None, clock=time.monotonic):
+        self.memory_factory = memory_factory
+        self.memory_budget_bytes = memory_budget_bytes if memory_budget_bytes is not None else SESSION_MEMORY_BUDGET_BYTES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else SESSION_TTL_SECONDS
+        self.max_sessions = max_sessions if max_sessions is not None else SESSION_MAX_COUNT
+        self.clock = clock
+        self.total_bytes = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, token):
+        return token in self._sessions
+
+    def get(self, token: str):
+        """Return the live session for token, or None if it is unknown or expired."""
+        if not token:
+            return None
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            now = self.clock()
+            if now - session.last_access > self.ttl_seconds:
+                self._remove(token)
+                return None
+            session.last_access = now
+            self._sessions.move_to_end(token)
+            return session
+
+    def get_or_create(self, token: str = None) -> Session:
+        session = self.get(token)
+        if session is not None:
+            return session
+        memory = self.memory_factory() if self.memory_factory else None
+        session = Session(secrets.token_urlsafe(32), memory=memory)
+        with self._lock:
+            session.last_access = self.clock()
+            self._sessions[session.token] = session
+            self._evict(keep=session.token)
+        return session
+
+    def update_footprint(self, session: Session):
+        """Re-measure a session after its data changed and evict others if over budget."""
+        nbytes = session.footprint()
+        with self._lock:
+            if session.token not in self._sessions:
+                return
+            self.total_bytes += nbytes - session.nbytes
+            session.nbytes = nbytes
+            self._evict(keep=session.token)
+
+    def footprints(self):
+        """(token, bytes, idle seconds) for each live session, most recently used last."""
+        with self._lock:
+            now = self.clock()
+            return [(token, session.nbytes, now - session.last_access) for token, session in self._sessions.items()]
+
+    def remove(self, token: str):
+        with self._lock:
+            self._remove(token)
+
+    def _remove(self, token: str):
+        session = self._sessions.pop(token, None)
+        if session is not None:
+            self.total_bytes -= session.nbytes
+
+    def _evict(self, keep: str):
+        # Drop expired sessions, then the least recently used until within budget
+        now = self.clock()
+        for token in [token for token, session in self._sessions.items()
+                      if token != keep and now - session.last_access > self.ttl_seconds]:
+            self._remove(token)
+        while len(self._sessions) > 1 and (self.total_bytes > self.memory_budget_bytes
+                                           or len(self._sessions) > self.max_sessions):
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                self._sessions.move_to_end(keep)
+                oldest = next(iter(self._sessions))
+            self._remove(oldest)
@@ -0,0 +1,150 @@
+import sys
+import numpy as np
+import pandas as pd
+
+# Column layout of a YNAB "transactions" export, as in the sample CSV
+EXPORT_COLUMNS = ['Account', 'Flag', 'Date', 'Payee', 'Category Group/Category', 'Category Group', 'Category',
+                  'Memo', 'Outflow', 'Inflow', 'Cleared']
+# String columns YNAB wraps in double quotes; amounts are written bare
+QUOTED_COLUMNS = {'Account', 'Flag', 'Date', 'Payee', 'Category Group/Category', 'Category Group', 'Category', 'Memo', 'Cleared'}
+SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+WRITE_CHUNK_ROWS = 250_000
+
+ACCOUNTS = ["Savings Account - Savings Account", "💳 Bre's Prime Visa", "💳 Michael's Prime Visa",
+            "Spending Account - Spending Account", "💳 Michael's Discover Card"]
+ACCOUNT_WEIGHTS = [0.15, 0.35, 0.25, 0.15, 0.10]
+
+# (group, category, relative frequency, median outflow in dollars, payees)
+CATEGORIES = [
+    ("Needs", "🚙 Subaru Payment", 2, 209.20, ["Transfer : 🚙 Subaru Loan"]),
+    ("Needs", "🛒 Groceries", 30, 85.00, ["Walmart", "Peterson's Fresh Market", "Sam's Club", "Costco", "Smith's"]),
+    ("Needs", "🐶 Azula", 4, 45.00, ["Alice's Pet Grooming", "Petsmart", "Chewy"]),
+    ("Needs", "🛜 Wifi", 2, 65.00, ["Xfinity"]),
+    ("Needs", "⛽️ Gas", 12, 38.00, ["Maverik", "Chevron", "Costco Gas"]),
+    ("Needs", "📱 Phone", 2, 52.00, ["Visible"]),
+    ("Needs", "💡 Utilities", 3, 110.00, ["Rocky Mountain Power", "Dominion Energy", "City Utilities"]),
+    ("Needs", "⛪️ Church", 2, 150.00, ["Church Donation"]),
+    ("Needs", "🛠 Auto Insurance", 1, 140.00, ["Progressive"]),
+    ("Needs", "🏠 Rent", 2, 1400.00, ["Landlord"]),
+    ("Wants", "🥷 Michael Allowance", 14, 18.00, ["Amazon", "Maverik", "Steam", "Venmo"]),
+    ("Wants", "❓Misc", 8, 25.00, ["Amazon", "Target", "Venmo"]),
+    ("Wants", "🍿 Recreation", 5, 40.00, ["Cinemark", "Top Golf", "Venmo"]),
+    ("Wants", "🍽️ Dining out", 16, 32.00, ["Cafe Rio", "Chick-fil-A", "Olive Garden", "Cubby's", "DoorDash"]),
+    ("Wants", "📱 Michael's Phone", 1, 30.00, ["Apple"]),
+    ("Wants", "💁‍♀️ Bre Allowance", 12, 22.00, ["Amazon", "Target", "TJ Maxx", "Venmo"]),
+    ("Wants", "💆 Personal Care", 4, 28.00, ["Ulta", "Walgreens"]),
+    ("Wants", "🏋️‍♂️ Gym Membership", 2, 35.00, ["VasaFitness"]),
+    ("Wants", "👔 Michael Clothes", 2, 45.00, ["Old Navy", "Amazon"]),
+    ("Wants", "💅 Salon", 2, 75.00, ["Salon Studio"]),
+    ("Wants", "🛋️ Home", 4, 60.00, ["IKEA", "Home Depot", "Amazon"]),
+    ("Wants", "📺 Subscriptions", 4, 14.99, ["Netflix", "Spotify", "Disney Plus"]),
+    ("Savings", "😌 Emergency fund", 12, 20.00, ["Surprise Savings Booster Transfer to Savings Account XXXXXX8822",
+                                                 "Surprise Savings Booster Transfer from Spending Account XXXXXX8833"]),
+    ("Savings", "💰Core Savings", 6, 100.00, ["Transfer : Savings Account - Savings Account"]),
+    ("Savings", "🏡 House", 3, 250.00, ["Transfer : Savings Account - Savings Account"]),
+    ("Rolling Savings", "🥳 Birthdays", 1, 45.00, ["Amazon", "Target"]),
+    ("Rolling Savings", "🛠️ Car Maintenance", 1, 120.00, ["Jiffy Lube", "Discount Tire"]),
+    ("Rolling Savings", "🛞 Tires", 1, 180.00, ["Discount Tire"]),
+    ("Rolling Savings", "🚗 Auto registration", 1, 95.00, ["Utah DMV"]),
+    ("Rolling Savings", "🐶 Vet Bills", 1, 130.00, ["Banfield Pet Hospital"]),
+    ("Rolling Savings", "🌳 YNAB subscription", 1, 109.00, ["YNAB"]),
+    ("Rolling Savings", "🎇 Holidays", 1, 60.00, ["Amazon", "Walmart"]),
+    ("Rolling Savings", "🎍 PPV", 1, 70.00, ["UFC"]),
+    ("Rolling Savings", "✈️ Vacations", 1, 220.00, ["Delta", "Airbnb"]),
+    ("Loans", "🎓 Michael Student Loans", 1, 150.00, ["Nelnet"]),
+]
+# Share of rows that are refunds or transfers in (an Inflow instead of an Outflow), by group
+INFLOW_SHARE = {"Needs": 0.01, "Wants": 0.03, "Savings": 0.30, "Rolling Savings": 0.02, "Loans": 0.0}
+
+
+def _quote(values: pd.Series) -> pd.Series:
+    return '"' + values.str.replace('"', '""', regex=False) + '"'
+
+
+def _format_amounts(cents: np.ndarray) -> np.ndarray:
+    # "$209.20", matching the sample's bare dollar amounts; amounts repeat, so format each value once
+    uniques, inverse = np.unique(cents, return_inverse=True)
+    formatted = np.array([f"${value // 100}.{value % 100:02d}" for value in uniques.tolist()], dtype=object)
+    return formatted[inverse]
+
+
+def generate_transactions(rows: int, seed: int = 0, end: str = "2025-09-01", days: int = 5 * 365) -> pd.DataFrame:
+    """A YNAB-shaped export of `rows` transactions over the `days` up to `end`, newest first, all as strings."""
+    rng = np.random.default_rng(seed)
+    weights = np.array([category[2] for category in CATEGORIES], dtype=float)
+    category = rng.choice(len(CATEGORIES), size=rows, p=weights / weights.sum())
+
+    groups = np.array([c[0] for c in CATEGORIES], dtype=object)
+    names = np.array([c[1] for c in CATEGORIES], dtype=object)
+    medians = np.array([c[3] for c in CATEGORIES])
+    # Payees flattened into one table; each category picks from its own slice
+    payee_table = np.array([payee for c in CATEGORIES for payee in c[4]], dtype=object)
+    payee_counts = np.array([len(c[4]) for c in CATEGORIES])
+    payee_offsets = np.concatenate([[0], np.cumsum(payee_counts)[:-1]])
+    payee = payee_table[payee_offsets[category] + (rng.random(rows) * payee_counts[category]).astype(np.int64)]
+
+    cents = np.maximum(np.rint(medians[category] * 100 * rng.lognormal(0.0, 0.6, rows)), 1).astype(np.int64)
+    inflow_share = np.array([INFLOW_SHARE[c[0]] for c in CATEGORIES])
+    is_inflow = rng.random(rows) < inflow_share[category]
+    zeros = np.zeros(rows, dtype=np.int64)
+
+    end_day = np.datetime64(end, 'D')
+    offsets = np.sort(rng.integers(0, max(days, 1), rows))
+    uniques, inverse = np.unique(offsets, return_inverse=True)
+    dates = pd.DatetimeIndex(end_day - uniques.astype('timedelta64[D]')).strftime('%m/%d/%Y').to_numpy(dtype=object)[inverse]
+
+    group = pd.Series(groups[category])
+    name = pd.Series(names[category])
+    return pd.DataFrame({
+        'Account': rng.choice(np.array(ACCOUNTS, dtype=object), size=rows, p=ACCOUNT_WEIGHTS),
+        'Flag': '',
+        'Date': dates,
+        'Payee': payee,
+        'Category Group/Category': group + ': ' + name,
+        'Category Group': group,
+        'Category': name,
+        'Memo': '',
+        'Outflow': _format_amounts(np.where(is_inflow, zeros, cents)),
+        'Inflow': _format_amounts(np.where(is_inflow, cents, zeros)),
+        'Cleared': np.where(rng.random(rows) < 0.9, 'Cleared', 'Uncleared'),
+    }, columns=EXPORT_COLUMNS)
+
+
+def _export_lines(df: pd.DataFrame) -> str:
+    columns = [_quote(df[column]) if column in QUOTED_COLUMNS else df[column] for column in EXPORT_COLUMNS]
+    lines = columns[0]
+    for column in columns[1:]:
+        lines = lines + ',' + column
+    return '\n'.join(lines.tolist()) + '\n'
+
+
+def write_export(file, rows: int, seed: int = 0, chunk_rows: int = WRITE_CHUNK_ROWS, end: str = "2025-09-01",
+                 days: int = 5 * 365):
+    """Write a synthetic export to a text file object in chunks, so 10M rows never sit in memory at once.
+
+    Each chunk has its own seed and covers the next stretch of the date range, newest first.
+    """
+    chunks = max(1, -(-rows // chunk_rows))
+    end = np.datetime64(end, 'D')
+    file.write('\ufeff' + ','.join(f'"{column}"' for column in EXPORT_COLUMNS) + '\n')
+    for i in range(chunks):
+        size = min(chunk_rows, rows - i * chunk_rows)
+        start_offset = days * i // chunks
+        chunk_days = days * (i + 1) // chunks - start_offset
+        frame = generate_transactions(size, seed=seed + i, end=str(end - np.timedelta64(start_offset, 'D')), days=chunk_days)
+        file.write(_export_lines(frame))
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(f"usage: python synthetic_data.py <{'|'.join(SIZES)}|rows> <output.csv>")
+        sys.exit(1)
+    size, path = sys.argv[1], sys.argv[2]
+    rows = SIZES.get(size.lower()) or int(size)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        write_export(f, rows)
+    print(f"Wrote {rows} transactions to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import pytest
+import io
+from fastapi.testclient import TestClient
+import main
+from batch_upload import BatchParser, dedupe_transactions, parse_export
+from ingestion import read_spending_csv
+
+HEADER = "Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared\n"
+# Two yearly exports that both contain the first days of January 2025
+EXPORT_2024 = HEADER + """Checking,,12/05/2024,Landlord,Needs: Rent,Needs,Rent,,$1400.00,$0.00,Cleared
+Visa,,12/20/2024,Cafe,Wants: Dining,Wants,Dining,,$4.50,$0.00,Cleared
+Visa,,01/02/2025,Cafe,Wants: Dining,Wants,Dining,,$4.50,$0.00,Cleared
+Visa,,01/02/2025,Cafe,Wants: Dining,Wants,Dining,,$4.50,$0.00,Cleared
+Checking,,01/03/2025,Landlord,Needs: Rent,Needs,Rent,,$1400.00,$0.00,Cleared
+"""
+EXPORT_2025 = HEADER + """Visa,,01/02/2025,Cafe,Wants: Dining,Wants,Dining,,$4.50,$0.00,Cleared
+Visa,,01/02/2025,Cafe,Wants: Dining,Wants,Dining,,$4.50,$0.00,Cleared
+Checking,,01/03/2025,Landlord,Needs: Rent,Needs,Rent,,$1400.00,$0.00,Cleared
+Visa,,02/10/2025,Walmart,Needs: Groceries,Needs,Groceries,,$95.25,$0.00,Cleared
+"""
+BROKEN = "Date,Outflow\n01/01/2025,$1.00\n"
+
+def frame(content: str):
+    return parse_export(content.encode('utf-8'))
+
+@pytest.fixture
+def batch_client(isolated_app, monkeypatch):
+    isolated_app(create_agent=lambda llm, df, **kwargs: object())
+    parser = BatchParser(max_workers=2)
+    monkeypatch.setattr(main, "batch_parser", parser)
+    yield TestClient(main.app)
+    parser.shutdown()
+
+def post_batch(client, *contents):
+    files = [("csv_files", (f"export-{i}.csv", content, "text/csv")) for i, content in enumerate(contents)]
+    return client.post("/uploadfiles/", files=files, data={"monthly_inflow": "3000"}).json()
+
+@pytest.mark.asyncio
+async def test_overlap_is_kept_once_and_repeats_within_a_file_survive():
+    merged, removed = dedupe_transactions([frame(EXPORT_2024), frame(EXPORT_2025)])
+
+    assert removed == 3
+    assert len(merged) == 6
+    # Both identical coffees on 01/02 are real purchases
+    cafe = merged[(merged['Payee'] == 'Cafe') & (merged['Month'] == 1)]
+    assert len(cafe) == 2
+    assert merged['Outflow'].sum() == 140000 + 450 + 2 * 450 + 140000 + 9525
+
+@pytest.mark.asyncio
+async def test_merged_frame_stays_compact():
+    merged, _ = dedupe_transactions([frame(EXPORT_2024), frame(EXPORT_2025)])
+
+    assert merged['Category'].dtype == 'category'
+    assert merged['Outflow'].dtype == 'int64'
+    assert '_occurrence' not in merged.columns
+
+@pytest.mark.asyncio
+async def test_batch_upload_matches_single_combined_export(batch_client):
+    result = post_batch(batch_client, EXPORT_2024, EXPORT_2025)
+    combined = HEADER + "".join(EXPORT_2024.splitlines(keepends=True)[1:] + EXPORT_2025.splitlines(keepends=True)[-1:])
+    cube, _ = read_spending_csv(io.BytesIO(combined.encode('utf-8')))
+
+    assert result["files"] == 2
+    assert result["transactions"] == 6
+    assert result["recommendations"] == main.build_recommendations(cube.monthly_totals(), 3000.0)
+    answer = batch_client.post("/chat", json={"message": "how much did I spend on dining in january 2025"}).json()
+    assert answer["response"] == "You spent $9.00 on Dining in January 2025."
+
+@pytest.mark.asyncio
+async def test_same_files_in_any_order_hit_the_cache(batch_client, monkeypatch):
+    first = post_batch(batch_client, EXPORT_2024, EXPORT_2025)
+
+    async def no_parsing(contents):
+        raise AssertionError("cached batch was parsed again")
+    monkeypatch.setattr(main.batch_parser, "parse", no_parsing)
+    assert post_batch(batch_client, EXPORT_2025, EXPORT_2024) == first
+
+@pytest.mark.asyncio
+async def test_bad_file_is_named_in_the_error(batch_client):
+    result = post_batch(batch_client, EXPORT_2024, BROKEN)
+
+    assert result == {"error": "export-1.csv: CSV must have 'Outflow', 'Inflow', 'Category', 'Category Group', and 'Date' columns"}
+
+@pytest.mark.asyncio
+async def test_batch_total_size_is_capped(batch_client, monkeypatch):
+    monkeypatch.setattr(main, "UPLOAD_BATCH_MAX_BYTES", len(EXPORT_2024) + len(EXPORT_2025) - 1)
+
+    assert post_batch(batch_client, EXPORT_2024, EXPORT_2025) == \
+        {"error": f"Uploads together exceed the {len(EXPORT_2024) + len(EXPORT_2025) - 1} byte limit."}
+    assert post_batch(batch_client, EXPORT_2024)["files"] == 1
@@ -0,0 +1,174 @@
+import pytest
+import asyncio
+import json
+import os
+import time
+import httpx
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+import main
+import instrumentation
+from chat_executor import ChatExecutor
+from sandbox import PythonSandbox
+
+CSV_CONTENT = """Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared
+Test Account,,08/01/2025,Paycheck,Income: Salary,Income,Salary,,$0.00,$2000.00,Cleared
+Test Account,,08/05/2025,Rent,Needs: Housing,Needs,Housing,,$1000.00,$0.00,Cleared
+Test Account,,08/15/2025,Concert,Wants: Entertainment,Wants,Entertainment,,$150.00,$0.00,Cleared
+"""
+
+class SlowChatModel(FakeListChatModel):
+    # Local stand-in for Gemini: one artificial delay per round-trip, then the canned response
+    delay: float = 0.0
+
+    def _call(self, *args, **kwargs):
+        time.sleep(self.delay)
+        return super()._call(*args, **kwargs)
+
+    def _stream(self, *args, **kwargs):
+        time.sleep(self.delay)
+        yield from super()._stream(*args, **kwargs)
+
+@pytest.fixture
+def fake_llm_app(isolated_app, monkeypatch, tmp_path):
+    def configure(delay: float, responses=None, **executor_limits):
+        responses = responses or ["Thought: I know this\nFinal Answer: 3 rows"]
+        isolated_app(lambda **kwargs: SlowChatModel(responses=responses, delay=delay))
+        monkeypatch.setattr(main, "chat_executor", ChatExecutor(**executor_limits))
+        monkeypatch.setattr(main, "python_sandbox", PythonSandbox(str(tmp_path / "sandbox"), max_workers=1))
+    return configure
+
+def client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver")
+
+async def upload(client):
+    response = await client.post("/uploadfile/", files={"csv_file": ("a.csv", CSV_CONTENT, "text/csv")},
+                                 data={"monthly_inflow": "2000"})
+    assert "recommendations" in response.json()
+
+def parse_events(body: str):
+    events = []
+    for raw in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in raw.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+@pytest.mark.asyncio
+async def test_slow_chat_does_not_block_other_endpoints(fake_llm_app):
+    fake_llm_app(delay=1.0)
+    async with client() as alice, client() as bob:
+        await upload(alice)
+        chat = asyncio.create_task(alice.post("/chat", json={"message": "how many rows?"}))
+        await asyncio.sleep(0.1)
+
+        start = time.perf_counter()
+        page = await bob.get("/")
+        await upload(bob)
+        elapsed = time.perf_counter() - start
+
+        assert page.status_code == 200
+        assert elapsed < 0.5
+        assert not chat.done()
+        assert (await chat).json() == {"response": "3 rows", "route": "agent"}
+
+@pytest.mark.asyncio
+async def test_slow_chat_does_not_block_its_own_session(fake_llm_app):
+    fake_llm_app(delay=1.0)
+    async with client() as alice:
+        await upload(alice)
+        chat = asyncio.create_task(alice.post("/chat", json={"message": "how many rows?"}))
+        await asyncio.sleep(0.1)
+
+        start = time.perf_counter()
+        memory = await alice.get("/session/memory")
+        delta = CSV_CONTENT.replace("08/", "09/")
+        appended = await alice.post("/transactions/append", files={"csv_file": ("d.csv", delta, "text/csv")})
+        await upload(alice)
+        elapsed = time.perf_counter() - start
+
+        assert "total_bytes" in memory.json()
+        assert appended.json()["appended"] == 3
+        assert elapsed < 0.5
+        assert not chat.done()
+        assert (await chat).json() == {"response": "3 rows", "route": "agent"}
+
+@pytest.mark.asyncio
+async def test_overlapping_requests_are_not_profiled(fake_llm_app, monkeypatch, tmp_path):
+    fake_llm_app(delay=0.5)
+    monkeypatch.setattr(instrumentation, "PROFILE_DIR", str(tmp_path / "profiles"))
+    async with client() as alice, client() as bob:
+        await upload(alice)
+        chat = asyncio.create_task(alice.post("/chat", json={"message": "how many rows?"}))
+        await asyncio.sleep(0.1)
+        await bob.get("/")
+        await chat
+        await bob.get("/")
+
+    # The chat and the page fetched during it overlapped, so only the requests made alone were dumped;
+    # work on executor and pool threads is profiled on its own thread either way
+    profiles = sorted(name.rsplit("-", 1)[1] for name in os.listdir(tmp_path / "profiles"))
+    assert profiles == ["GET.prof", "POST_uploadfile.prof", "agent_invoke.prof", "upload_parse.prof"]
+
+@pytest.mark.asyncio
+async def test_saturated_pool_returns_429(fake_llm_app):
+    fake_llm_app(delay=0.5, max_workers=1, max_queue=0)
+    async with client() as alice, client() as bob:
+        await upload(alice)
+        await upload(bob)
+        first = asyncio.create_task(alice.post("/chat", json={"message": "hi"}))
+        await asyncio.sleep(0.1)
+
+        second = await bob.post("/chat", json={"message": "hi"})
+
+        assert second.status_code == 429
+        assert (await first).status_code == 200
+
+@pytest.mark.asyncio
+async def test_per_session_limit_returns_429(fake_llm_app):
+    fake_llm_app(delay=0.5, max_workers=4, max_per_session=1)
+    async with client() as alice:
+        await upload(alice)
+        first = asyncio.create_task(alice.post("/chat", json={"message": "hi"}))
+        await asyncio.sleep(0.1)
+
+        second = await alice.post("/chat", json={"message": "again"})
+
+        assert second.status_code == 429
+        assert second.json() == {"response": "Please wait for your previous question to finish."}
+        assert (await first).status_code == 200
+
+@pytest.mark.asyncio
+async def test_slow_agent_times_out(fake_llm_app):
+    fake_llm_app(delay=1.0, timeout_seconds=0.2)
+    async with client() as alice:
+        await upload(alice)
+
+        response = await alice.post("/chat", json={"message": "hi"})
+
+        assert response.status_code == 504
+
+@pytest.mark.asyncio
+async def test_stream_emits_steps_tokens_and_answer(fake_llm_app):
+    fake_llm_app(delay=0.0, responses=["Thought: count\nAction: python_repl_ast\nAction Input: len(df)",
+                                         "Thought: done\nFinal Answer: 3 rows"])
+    async with client() as alice:
+        await upload(alice)
+
+        response = await alice.post("/chat/stream", json={"message": "how many rows?"})
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = parse_events(response.text)
+        kinds = [event for event, _ in events]
+        assert events[0] == ("route", "agent")
+        assert "token" in kinds
+        assert ("step", {"tool": "python_repl_ast", "tool_input": "len(df)"}) in events
+        assert ("observation", "3") in events
+        assert events[-1] == ("final", "3 rows")
+        assert kinds.index("step") < kinds.index("observation") < kinds.index("final")
+
+@pytest.mark.asyncio
+async def test_stream_before_upload(fake_llm_app):
+    fake_llm_app(delay=0.0)
+    async with client() as alice:
+        response = await alice.post("/chat/stream", json={"message": "hi"})
+
+        assert parse_events(response.text) == [("final", "Please upload a CSV file first.")]
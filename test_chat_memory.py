@@ -0,0 +1,176 @@
+import pytest
+import asyncio
+import time
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+import main
+import instrumentation
+from chat_memory import ChatMemory, estimate_tokens
+from sessions import SessionStore
+
+CSV_CONTENT = """Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared
+Checking,,07/01/2025,Paycheck,Inflow: Ready to Assign,Inflow,Ready to Assign,,$0.00,$3000.00,Cleared
+Checking,,07/05/2025,Landlord,Needs: 🏠 Rent,Needs,🏠 Rent,,$1400.00,$0.00,Cleared
+Visa,,07/09/2025,Walmart,Needs: 🛒 Groceries,Needs,🛒 Groceries,,$200.00,$0.00,Cleared
+Checking,,08/05/2025,Landlord,Needs: 🏠 Rent,Needs,🏠 Rent,,$1400.00,$0.00,Cleared
+Visa,,08/09/2025,Walmart,Needs: 🛒 Groceries,Needs,🛒 Groceries,,$420.50,$0.00,Cleared
+"""
+
+class RecordingChatModel(FakeListChatModel):
+    # Local stand-in for Gemini that records the size of every prompt it is sent
+    prompt_sizes: list = []
+
+    def _record(self, messages):
+        self.prompt_sizes.append(sum(len(str(message.content)) for message in messages))
+
+    def _call(self, messages, *args, **kwargs):
+        self._record(messages)
+        return super()._call(messages, *args, **kwargs)
+
+    def _stream(self, messages, *args, **kwargs):
+        self._record(messages)
+        yield from super()._stream(messages, *args, **kwargs)
+
+@pytest.mark.asyncio
+async def test_window_folds_old_turns_into_summary():
+    memory = ChatMemory(token_budget=400)
+    for turn in range(20):
+        memory.add_turn(f"question {turn}?", f"answer {turn} " + "detail " * 10)
+
+    assert memory.turns[-1][0] == "question 19?"
+    assert memory.turns[0][0] != "question 0?"
+    assert "question 0?" not in memory.summary
+    assert f"question {20 - len(memory.turns) - 1}?" in memory.summary
+    assert memory.tokens() <= memory.token_budget
+
+@pytest.mark.asyncio
+async def test_long_answers_are_clipped_to_the_window():
+    memory = ChatMemory(token_budget=400)
+    memory.add_turn("short?", "short")
+    memory.add_turn("tell me everything", "word " * 1000)
+
+    assert len(memory.turns) == 2
+    assert memory.tokens() <= memory.token_budget
+
+@pytest.mark.asyncio
+async def test_facts_keep_the_newest_within_budget():
+    memory = ChatMemory(token_budget=400)
+    for month in range(1, 40):
+        memory.remember({f"Spending in month {month}": f"${month}.00"})
+    memory.remember({"Spending in month 39": "$39.50"})
+
+    assert estimate_tokens(memory._facts_text()) <= memory.fact_budget
+    assert "Spending in month 1" not in memory.facts
+    assert list(memory.facts.items())[-1] == ("Spending in month 39", "$39.50")
+
+@pytest.mark.asyncio
+async def test_render_is_the_bare_message_until_something_is_remembered():
+    memory = ChatMemory()
+    assert memory.render("hi") == "hi"
+
+    memory.add_turn("hi", "hello")
+    rendered = memory.render("and now?")
+    assert "User: hi\nAssistant: hello" in rendered
+    assert rendered.endswith("Current question: and now?")
+
+@pytest.mark.asyncio
+async def test_custom_summarizer_receives_rolled_turns():
+    calls = []
+    def summarizer(summary, turns):
+        calls.append(list(turns))
+        return f"{len(calls)} folds"
+
+    memory = ChatMemory(token_budget=200, summarizer=summarizer)
+    for turn in range(10):
+        memory.add_turn(f"q{turn}", "a" * 40)
+
+    assert calls and calls[0][0] == ("q0", "a" * 40)
+    assert memory.summary == f"{len(calls)} folds"
+
+@pytest.mark.asyncio
+async def test_prompt_size_stays_flat_over_a_long_conversation(isolated_app):
+    answer = "Final Answer: Your rent was steady, and groceries rose " + "noticeably " * 20
+    model = RecordingChatModel(responses=[answer], prompt_sizes=[])
+    isolated_app(lambda **kwargs: model)
+    client = TestClient(main.app)
+    client.post("/uploadfile/", files={"csv_file": ("a.csv", CSV_CONTENT, "text/csv")}, data={"monthly_inflow": "3000"})
+
+    for turn in range(500):
+        if turn % 5 == 0:
+            result = client.post("/chat", json={"message": "How much did I spend on groceries in July?"}).json()
+            assert result["route"] == "fast_path"
+        else:
+            result = client.post("/chat", json={"message": f"Any advice about my spending, part {turn}?"}).json()
+            assert result["route"] == "agent"
+
+    session = main.sessions.get(client.cookies["session_id"])
+    sizes = model.prompt_sizes
+    assert len(sizes) == 400
+    assert session.memory.facts["Spending on 🛒 Groceries in July 2025"] == "$200.00"
+    assert "Spending on 🛒 Groceries in July 2025: $200.00" in session.memory.render("next")
+    # Once the window is full the prompt stops growing: the last turns are no bigger than the early ones
+    assert max(sizes[-100:]) <= max(sizes[:100])
+    assert max(sizes) - sizes[0] <= session.memory.token_budget * 4
+
+@pytest.mark.asyncio
+async def test_summarizer_runs_outside_the_lock_and_failures_fall_back():
+    memory = ChatMemory(token_budget=200)
+    def summarizer(summary, turns):
+        assert not memory._lock.locked()
+        raise RuntimeError("model unavailable")
+    memory.summarizer = summarizer
+    instrumentation.metrics.reset()
+
+    for turn in range(10):
+        memory.add_turn(f"q{turn}", "a" * 40, fold=False)
+    assert memory.pending and not memory.summary
+    memory.fold()
+
+    assert not memory.pending
+    assert memory.summary.endswith(f'asked "q{9 - len(memory.turns)}" -> ' + "a" * 40)
+    assert instrumentation.metrics.snapshot()["counters"]["chat_memory.summarizer_errors"] == 1
+
+@pytest.mark.asyncio
+async def test_fast_path_turns_are_summarized_off_the_event_loop(isolated_app, monkeypatch):
+    threads = []
+    def summarizer(summary, turns):
+        try:
+            asyncio.get_running_loop()
+            threads.append("event loop")
+        except RuntimeError:
+            threads.append("executor")
+        raise RuntimeError("model unavailable")
+    isolated_app()
+    monkeypatch.setattr(main, "sessions", SessionStore(memory_factory=lambda: ChatMemory(token_budget=200, summarizer=summarizer)))
+    client = TestClient(main.app)
+    client.post("/uploadfile/", files={"csv_file": ("a.csv", CSV_CONTENT, "text/csv")}, data={"monthly_inflow": "3000"})
+
+    for _ in range(10):
+        result = client.post("/chat", json={"message": "How much did I spend on groceries in July?"})
+        assert result.json()["route"] == "fast_path"
+
+    memory = main.sessions.get(client.cookies["session_id"]).memory
+    deadline = time.monotonic() + 5
+    while memory.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with memory._fold_lock:
+        assert threads and set(threads) == {"executor"}
+        assert "How much did I spend on groceries in July?" in memory.summary
+
+@pytest.mark.asyncio
+async def test_new_data_clears_remembered_figures(isolated_app):
+    isolated_app()
+    client = TestClient(main.app)
+    client.post("/uploadfile/", files={"csv_file": ("a.csv", CSV_CONTENT, "text/csv")}, data={"monthly_inflow": "3000"})
+    question = {"message": "How much did I spend on groceries in August?"}
+    assert client.post("/chat", json=question).json()["response"] == "You spent $420.50 on 🛒 Groceries in August 2025."
+    memory = main.sessions.get(client.cookies["session_id"]).memory
+    assert "Spending on 🛒 Groceries in August 2025: $420.50" in memory.render("next")
+
+    delta = CSV_CONTENT.splitlines()[0] + "\nVisa,,08/20/2025,Costco,Needs: 🛒 Groceries,Needs,🛒 Groceries,,$50.00,$0.00,Cleared\n"
+    assert client.post("/transactions/append", files={"csv_file": ("d.csv", delta, "text/csv")}).json()["appended"] == 1
+
+    assert not memory.facts
+    assert "Figures already computed" not in memory.render("next")
+    assert client.post("/chat", json=question).json()["response"] == "You spent $470.50 on 🛒 Groceries in August 2025."
+    assert memory.facts == {"Spending on 🛒 Groceries in August 2025": "$470.50"}
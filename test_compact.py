@@ -0,0 +1,66 @@
+import pytest
+import io
+import pandas as pd
+from fastapi.testclient import TestClient
+import main
+from ingestion import read_spending_csv, memory_report
+
+HEADER = "Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared\n"
+ROWS = [
+    "Checking,,07/01/2025,Paycheck,Inflow: Ready to Assign,Inflow,Ready to Assign,,$0.00,$3000.00,Cleared",
+    "Checking,,07/05/2025,Landlord,Needs: Rent,Needs,Rent,,$1400.00,$0.00,Cleared",
+    "Visa,,07/09/2025,Walmart,Needs: Groceries,Needs,Groceries,,$200.10,$0.00,Cleared",
+    "Visa,,08/02/2025,Cinema,Wants: Movies,Wants,Movies,,$30.00,$0.00,Cleared",
+]
+
+def make_csv(repeat: int) -> bytes:
+    return (HEADER + "\n".join(ROWS * repeat) + "\n").encode('utf-8')
+
+@pytest.mark.asyncio
+async def test_frame_is_categorical_with_integer_cents():
+    _, df = read_spending_csv(io.BytesIO(make_csv(1)))
+
+    for column in ['Category Group', 'Category', 'Payee', 'Account']:
+        assert isinstance(df[column].dtype, pd.CategoricalDtype)
+    assert df['Outflow'].dtype == 'int64'
+    assert df['Inflow'].dtype == 'int64'
+    assert df['Month'].dtype == 'int8'
+    assert df['Year'].dtype == 'int16'
+    assert df['Outflow'].tolist() == [0, 140000, 20010, 3000]
+    assert df['Inflow'].tolist() == [300000, 0, 0, 0]
+
+@pytest.mark.asyncio
+async def test_categories_are_merged_across_chunks():
+    # Each chunk sees a different set of payees; the combined frame must stay categorical
+    _, df = read_spending_csv(io.BytesIO(make_csv(1)), chunk_rows=1)
+
+    assert isinstance(df['Payee'].dtype, pd.CategoricalDtype)
+    assert df['Payee'].astype(object).tolist() == ['Paycheck', 'Landlord', 'Walmart', 'Cinema']
+    assert sorted(df['Payee'].cat.categories) == ['Cinema', 'Landlord', 'Paycheck', 'Walmart']
+
+@pytest.mark.asyncio
+async def test_compact_frame_is_much_smaller_than_object_frame():
+    content = make_csv(5_000)
+    _, df = read_spending_csv(io.BytesIO(content), chunk_rows=3_000)
+    # The layout frames had before: object strings, float dollars and int64 date parts
+    plain = df.astype({'Category Group': object, 'Category': object, 'Payee': object, 'Account': object,
+                       'Outflow': float, 'Inflow': float, 'Month': 'int64', 'Year': 'int64'})
+
+    compact_bytes = memory_report(df)["total_bytes"]
+    plain_bytes = int(plain.memory_usage(deep=True).sum())
+    assert compact_bytes * 4 < plain_bytes
+
+@pytest.mark.asyncio
+async def test_session_memory_report(isolated_app):
+    isolated_app(create_agent=lambda llm, df, **kwargs: object())
+    client = TestClient(main.app)
+
+    assert client.get("/session/memory").json() == {"error": "Please upload a CSV file first."}
+    client.post("/uploadfile/", files={"csv_file": ("b.csv", make_csv(2), "text/csv")}, data={"monthly_inflow": "3000"})
+    report = client.get("/session/memory").json()
+
+    assert report["frame"]["rows"] == 8
+    assert set(report["frame"]["columns"]) >= {'Outflow', 'Inflow', 'Category', 'Payee', 'Month', 'Year'}
+    assert report["frame"]["columns"]["Outflow"] == 8 * 8
+    assert report["cube"]["cells"] == 4
+    assert report["total_bytes"] == report["frame"]["total_bytes"] + report["cube"]["bytes"]
@@ -0,0 +1,90 @@
+import pytest
+from types import SimpleNamespace
+import io
+import pandas as pd
+from fastapi.testclient import TestClient
+import main
+from cube import SpendingCube
+from ingestion import read_spending_csv
+
+HEADER = "Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared\n"
+HISTORY = HEADER + """Checking,,07/01/2025,Paycheck,Inflow: Ready to Assign,Inflow,Ready to Assign,,$0.00,$3000.00,Cleared
+Checking,,07/05/2025,Landlord,Needs: Rent,Needs,Rent,,$1400.00,$0.00,Cleared
+Visa,,07/09/2025,Walmart,Needs: Groceries,Needs,Groceries,,$200.00,$0.00,Cleared
+Visa,,07/19/2025,Walmart,Needs: Groceries,Needs,Groceries,,$150.00,$0.00,Cleared
+Visa,,08/02/2025,Cinema,Wants: Movies,Wants,Movies,,$30.00,$0.00,Cleared
+"""
+DELTA = HEADER + """Visa,,08/09/2025,Walmart,Needs: Groceries,Needs,Groceries,,$120.25,$0.00,Uncleared
+Visa,,08/10/2025,Cinema,Wants: Movies,Wants,Movies,,$15.00,$0.00,Uncleared
+Checking,,09/01/2025,Landlord,Needs: Rent,Needs,Rent,,$1400.00,$0.00,Uncleared
+"""
+
+def parse(content: str) -> pd.DataFrame:
+    _, df = read_spending_csv(io.BytesIO(content.encode('utf-8')))
+    return df
+
+def sorted_cells(cube: SpendingCube) -> pd.DataFrame:
+    cells = cube.to_frame().astype({dimension: object for dimension in ['Category Group', 'Category', 'Payee', 'Account']})
+    return cells.sort_values(['Year', 'Month', 'Category', 'Payee', 'Account']).reset_index(drop=True)
+
+@pytest.mark.asyncio
+async def test_cells_hold_sums_and_counts():
+    cube = SpendingCube.from_frame(parse(HISTORY))
+    cells = sorted_cells(cube)
+
+    groceries = cells[(cells['Category'] == 'Groceries')]
+    assert groceries[['outflow', 'count']].values.tolist() == [[35000, 2]]
+    assert cube.size == 4
+    assert cube.rows == 5
+
+@pytest.mark.asyncio
+async def test_incremental_append_matches_full_rebuild():
+    cube = SpendingCube.from_frame(parse(HISTORY))
+    cube.append(parse(DELTA))
+    rebuilt = SpendingCube.from_frame(pd.concat([parse(HISTORY), parse(DELTA)], ignore_index=True))
+
+    pd.testing.assert_frame_equal(sorted_cells(cube), sorted_cells(rebuilt))
+    pd.testing.assert_frame_equal(cube.monthly_totals(), rebuilt.monthly_totals())
+    assert cube.size == 6
+    assert cube.rows == 8
+    assert cube.version == 2
+
+@pytest.mark.asyncio
+async def test_monthly_totals_split_needs_wants_other():
+    totals = SpendingCube.from_frame(parse(HISTORY)).monthly_totals()
+
+    assert totals.loc[(2025, 7)].tolist() == [1750.0, 3000.0, 1750.0, 0.0, 0.0]
+    assert totals.loc[(2025, 8)].tolist() == [30.0, 0.0, 0.0, 30.0, 0.0]
+
+@pytest.mark.asyncio
+async def test_loaded_cube_appends_without_touching_saved_files(tmp_path):
+    SpendingCube.from_frame(parse(HISTORY)).save(str(tmp_path))
+
+    cube = SpendingCube.load(str(tmp_path))
+    cube.append(parse(DELTA))
+
+    assert SpendingCube.load(str(tmp_path)).rows == 5
+    assert cube.rows == 8
+    assert cube.monthly_totals().loc[(2025, 9), 'needs'] == 1400.0
+
+@pytest.mark.asyncio
+async def test_append_endpoint_updates_session(isolated_app):
+    agents = []
+    isolated_app(create_agent=lambda llm, df, **kwargs: agents.append(df) or SimpleNamespace())
+    client = TestClient(main.app)
+
+    assert client.post("/transactions/append", files={"csv_file": ("d.csv", DELTA, "text/csv")}).json() == \
+        {"error": "Please upload a CSV file first."}
+    client.post("/uploadfile/", files={"csv_file": ("h.csv", HISTORY, "text/csv")}, data={"monthly_inflow": "3000"})
+    result = client.post("/transactions/append", files={"csv_file": ("d.csv", DELTA, "text/csv")}).json()
+
+    assert result["appended"] == 3
+    assert "\n--- September 2025 ---" in result["recommendations"]
+    assert "Wants Spent: $45.00" in result["recommendations"]
+    # The stale agent is dropped and rebuilt over all 8 rows when a chat next needs it
+    session = main.sessions.get(client.cookies["session_id"])
+    assert session.agent is None
+    main.session_agent(session)
+    assert len(agents[-1]) == 8
+    fast = client.post("/chat", json={"message": "how much did I spend on groceries in august"}).json()
+    assert fast == {"response": "You spent $120.25 on Groceries in August 2025.", "route": "fast_path"}
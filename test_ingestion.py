@@ -0,0 +1,63 @@
+import pytest
+import io
+import pandas as pd
+from fastapi.testclient import TestClient
+import main
+from main import process_spending_data
+from ingestion import read_spending_csv, MissingColumns, UploadTooLarge
+
+CSV_CONTENT = """Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared
+Test Account,,07/01/2025,Paycheck,Income: Salary,Income,Salary,,$0.00,$1500.00,Cleared
+Test Account,,07/05/2025,Rent,Needs: Housing,Needs,Housing,,$800.00,$0.00,Cleared
+Test Account,,07/09/2025,Concert,Wants: Entertainment,Wants,Entertainment,,$45.50,$0.00,Cleared
+Test Account,,08/01/2025,Paycheck,Income: Salary,Income,Salary,,$0.00,$2000.00,Cleared
+Test Account,,08/05/2025,Rent,Needs: Housing,Needs,Housing,,$1000.00,$0.00,Cleared
+Test Account,,08/12/2025,Misc,Other: Misc,Other,Misc,,$12.25,$0.00,Cleared
+Test Account,,09/02/2025,Groceries,Needs: Food,Needs,Food,,$150.00,$0.00,Cleared
+"""
+
+@pytest.mark.asyncio
+async def test_chunked_totals_match_full_frame():
+    cube, df = read_spending_csv(io.BytesIO(CSV_CONTENT.encode('utf-8')), chunk_rows=2)
+    expected = process_spending_data(pd.read_csv(io.StringIO(CSV_CONTENT)), 1500.0)
+
+    assert main.build_monthly_summary(cube.monthly_totals(), 1500.0) == expected
+    assert len(df) == 7
+    assert set(df.columns) == {'Account', 'Date', 'Payee', 'Category Group', 'Category', 'Outflow', 'Inflow', 'Month', 'Year'}
+
+@pytest.mark.asyncio
+async def test_totals_only_mode_keeps_no_frame():
+    cube, df = read_spending_csv(io.BytesIO(CSV_CONTENT.encode('utf-8')), keep_frame=False, chunk_rows=3)
+    totals = cube.monthly_totals()
+
+    assert df is None
+    assert totals.loc[(2025, 8), 'needs'] == 1000.00
+    assert totals.loc[(2025, 9), 'outflow'] == 150.00
+
+@pytest.mark.asyncio
+async def test_missing_columns_rejected():
+    csv_content = "Date,Outflow,Inflow\n08/01/2025,$1.00,$0.00\n"
+
+    with pytest.raises(MissingColumns):
+        read_spending_csv(io.BytesIO(csv_content.encode('utf-8')))
+
+@pytest.mark.asyncio
+async def test_row_limit_rejected():
+    with pytest.raises(UploadTooLarge):
+        read_spending_csv(io.BytesIO(CSV_CONTENT.encode('utf-8')), chunk_rows=2, max_rows=5)
+
+@pytest.mark.asyncio
+async def test_byte_limit_rejected():
+    with pytest.raises(UploadTooLarge):
+        read_spending_csv(io.BytesIO(CSV_CONTENT.encode('utf-8')), max_bytes=100)
+
+@pytest.mark.asyncio
+async def test_upload_over_byte_limit_returns_error(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setattr(main, "UPLOAD_MAX_BYTES", 100)
+    client = TestClient(main.app)
+
+    response = client.post("/uploadfile/", files={"csv_file": ("export.csv", CSV_CONTENT.encode('utf-8'), "text/csv")},
+                           data={"monthly_inflow": "1500"})
+
+    assert response.json() == {"error": "Upload exceeds the 100 byte limit."}
@@ -0,0 +1,60 @@
+import pytest
+import subprocess
+import sys
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+import main
+
+CSV_CONTENT = """Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared
+Test Account,,08/01/2025,Paycheck,Income: Salary,Income,Salary,,$0.00,$2000.00,Cleared
+Test Account,,08/05/2025,Rent,Needs: Housing,Needs,Housing,,$1000.00,$0.00,Cleared
+"""
+
+@pytest.fixture
+def counting_app(isolated_app):
+    built = {"llms": 0, "agents": 0}
+
+    def create_llm(**options):
+        built["llms"] += 1
+        return FakeListChatModel(responses=["Thought: I know this\nFinal Answer: 2 rows"])
+
+    real_create_agent = main.create_pandas_dataframe_agent
+    def create_agent(llm, df, **kwargs):
+        built["agents"] += 1
+        return real_create_agent(llm, df, **kwargs)
+
+    isolated_app(create_llm, create_agent=create_agent)
+    return built
+
+def upload(client):
+    result = client.post("/uploadfile/", files={"csv_file": ("a.csv", CSV_CONTENT, "text/csv")}, data={"monthly_inflow": "2000"})
+    assert "recommendations" in result.json()
+
+@pytest.mark.asyncio
+async def test_importing_the_app_skips_the_llm_stack():
+    code = ("import sys, main; print(sorted(m for m in ['langchain_core', 'langchain_google_genai', 'langchain_experimental', 'langchain.memory'] "
+            "if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+@pytest.mark.asyncio
+async def test_uploads_and_fast_path_chats_build_no_agent(counting_app):
+    client = TestClient(main.app)
+    upload(client)
+    upload(client)
+    fast = client.post("/chat", json={"message": "how much did I spend on rent in august 2025"}).json()
+
+    assert fast["route"] == "fast_path"
+    assert counting_app == {"llms": 0, "agents": 0}
+
+@pytest.mark.asyncio
+async def test_agent_is_built_once_and_llm_shared_across_sessions(counting_app):
+    alice, bob = TestClient(main.app), TestClient(main.app)
+    upload(alice)
+    upload(bob)
+    for client in [alice, alice, bob]:
+        assert client.post("/chat", json={"message": "How many rows are there?"}).json()["response"] == "2 rows"
+
+    assert counting_app == {"llms": 1, "agents": 2}
+    session = main.sessions.get(alice.cookies["session_id"])
+    assert session.memory is not None
@@ -115,4 +115,17 @@ async def test_monthly_inflow_not_provided():
     
     assert len(recommendations) == 2
     assert "Monthly inflow not provided, cannot assess spending against 50/30 rule." in recommendations
-    assert "Monthly inflow not provided, cannot assess spending against income." in recommendations
\ No newline at end of file
+    assert "Monthly inflow not provided, cannot assess spending against income." in recommendations
+
+@pytest.mark.asyncio
+async def test_missing_amounts_are_skipped():
+    df = pd.DataFrame({
+        'Category Group': ['Needs', 'Wants', 'Wants'],
+        'Outflow': [100.00, 50.00, float('nan')],
+        'Inflow': [0.00, 0.00, 0.00]
+    })
+
+    recommendations = calculate_50_30_recommendations(df, 1000.0)
+
+    assert "Great job! Your spending on Needs and Wants is within the recommended 50/30 rule relative to your inflow." in recommendations
+    assert "You have a surplus of $850.00 this month. Consider saving or investing this amount." in recommendations
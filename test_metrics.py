@@ -0,0 +1,83 @@
+import pytest
+import os
+import pstats
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+import main
+import instrumentation
+from chat_executor import ChatExecutor
+from instrumentation import Metrics, Histogram, profiled
+
+CSV_CONTENT = """Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared
+Test Account,,08/01/2025,Paycheck,Income: Salary,Income,Salary,,$0.00,$2000.00,Cleared
+Test Account,,08/05/2025,Rent,Needs: Housing,Needs,Housing,,$1000.00,$0.00,Cleared
+Test Account,,08/15/2025,Concert,Wants: Entertainment,Wants,Entertainment,,$150.00,$0.00,Cleared
+Test Account,,08/16/2025,Broken,Wants: Entertainment,Wants,Entertainment,,n/a,$0.00,Cleared
+"""
+
+@pytest.fixture
+def app_client(isolated_app, monkeypatch):
+    isolated_app(lambda **kwargs: FakeListChatModel(responses=["Thought: I know this\nFinal Answer: 3 rows"]))
+    monkeypatch.setattr(main, "chat_executor", ChatExecutor())
+    instrumentation.metrics.reset()
+    return TestClient(main.app)
+
+@pytest.mark.asyncio
+async def test_histogram_buckets_and_failed_spans():
+    histogram = Histogram(buckets=(0.1, 1.0, float('inf')))
+    for value in [0.05, 0.1, 0.5, 3.0]:
+        histogram.observe(value)
+    assert histogram.snapshot() == {"count": 4, "sum": 3.65, "buckets": {"0.1": 2, "1.0": 1, "+Inf": 1}}
+
+    metrics = Metrics()
+    with pytest.raises(ValueError):
+        with metrics.span("failing"):
+            raise ValueError("boom")
+    metrics.increment("rows", 3)
+    snapshot = metrics.snapshot()
+    assert snapshot["latency_seconds"]["failing"]["count"] == 1
+    assert snapshot["counters"] == {"rows": 3}
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_spans_counts_and_sessions(app_client):
+    upload = app_client.post("/uploadfile/", files={"csv_file": ("a.csv", CSV_CONTENT, "text/csv")},
+                             data={"monthly_inflow": "2000"})
+    assert "recommendations" in upload.json()
+    assert app_client.post("/chat", json={"message": "How many rows are there?"}).json()["response"] == "3 rows"
+
+    report = app_client.get("/metrics").json()
+    latency = report["latency_seconds"]
+    for name in ["ingest.read", "ingest.clean", "ingest.parse_dates", "aggregate.cube_append", "aggregate.monthly",
+                 "agent.build", "agent.invoke", "request POST /uploadfile/", "request POST /chat"]:
+        assert latency[name]["count"] >= 1, name
+    assert report["counters"]["rows.read"] == 4
+    assert report["counters"]["rows.invalid"] == 1
+    assert report["counters"]["rows.uploaded"] == 3
+    # Slow agent calls left running by other tests may also land here
+    assert report["counters"]["llm.calls"] >= 1
+    assert report["chat"]["routes"]["agent"]["count"] == 1
+
+    token = upload.cookies["session_id"]
+    [session] = report["sessions"]["per_session"]
+    assert session["bytes"] > 0
+    assert session["id"] not in token
+    assert report["sessions"]["total_bytes"] == session["bytes"]
+
+@pytest.mark.asyncio
+async def test_profiling_dumps_one_profile_per_request(app_client, monkeypatch, tmp_path):
+    monkeypatch.setattr(instrumentation, "PROFILE_DIR", str(tmp_path / "profiles"))
+    app_client.post("/uploadfile/", files={"csv_file": ("a.csv", CSV_CONTENT, "text/csv")}, data={"monthly_inflow": "2000"})
+
+    # The request's event-loop work, and the parse on its executor thread
+    request, parse = sorted(os.listdir(tmp_path / "profiles"), key=lambda name: name.rsplit("-", 1)[1])
+    assert request.endswith("-POST_uploadfile.prof")
+    assert parse.endswith("-upload_parse.prof")
+    stats = pstats.Stats(str(tmp_path / "profiles" / parse))
+    assert any(function == "read_spending_csv" for _, _, function in stats.stats)
+
+@pytest.mark.asyncio
+async def test_nested_profiles_are_skipped(tmp_path):
+    with profiled("outer", str(tmp_path)):
+        with profiled("inner", str(tmp_path)):
+            sum(range(1000))
+    assert [name.split("-")[-1] for name in os.listdir(tmp_path)] == ["outer.prof"]
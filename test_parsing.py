@@ -0,0 +1,48 @@
+import pytest
+import pandas as pd
+from parsing import parse_currency_cents, parse_dates
+
+@pytest.mark.asyncio
+async def test_currency_thousands_separators():
+    values = pd.Series(["$1,234.56", "$12,000.00", "$0.00", "$1,000,000.01", "1234.56", "$\u00a0123,456.00 "])
+
+    assert parse_currency_cents(values).tolist() == [123456, 1200000, 0, 100000001, 123456, 12345600]
+
+@pytest.mark.asyncio
+async def test_currency_negatives_and_parentheses():
+    values = pd.Series(["-$12.34", "$-5.00", "($1,250.75)", "-0.50"])
+
+    assert parse_currency_cents(values).tolist() == [-1234, -500, -125075, -50]
+
+@pytest.mark.asyncio
+async def test_currency_invalid_values_are_missing():
+    values = pd.Series(["$12.34", None, "", "abc", "1e5", "$1.2.3", "12-34", "$1,2,3", "1,23.00", "(12.00", "-(5)", "--5",
+                        "$12,34.56", "$1234,567.00", "$,123.00", "$1,23,456.00"])
+
+    parsed = parse_currency_cents(values)
+
+    assert parsed.iloc[0] == 1234
+    assert parsed.iloc[1:].isna().all()
+
+@pytest.mark.asyncio
+async def test_currency_numeric_input():
+    values = pd.Series([1.1, 200.0, 0.29])
+
+    assert parse_currency_cents(values).tolist() == [110, 20000, 29]
+
+@pytest.mark.asyncio
+async def test_dates_repeated_and_missing():
+    values = pd.Series(["08/01/2025", "08/01/2025", None, "12/31/2024"], index=[10, 11, 12, 13])
+
+    parsed = parse_dates(values)
+
+    assert parsed.index.tolist() == [10, 11, 12, 13]
+    assert parsed.iloc[0] == pd.Timestamp("2025-08-01")
+    assert parsed.iloc[1] == pd.Timestamp("2025-08-01")
+    assert pd.isna(parsed.iloc[2])
+    assert parsed.iloc[3] == pd.Timestamp("2024-12-31")
+
+@pytest.mark.asyncio
+async def test_dates_wrong_format_raises():
+    with pytest.raises(ValueError):
+        parse_dates(pd.Series(["2025-08-01"]))
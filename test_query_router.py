@@ -0,0 +1,106 @@
+import pytest
+import io
+from fastapi.testclient import TestClient
+import main
+from ingestion import read_spending_csv
+from query_router import SpendingAggregates, QueryRouter, answer_query, FAST_PATH, AGENT
+
+CSV_CONTENT = """Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared
+Checking,,07/01/2025,Paycheck,Inflow: Ready to Assign,Inflow,Ready to Assign,,$0.00,$3000.00,Cleared
+Checking,,07/05/2025,Landlord,Needs: 🏠 Rent,Needs,🏠 Rent,,$1400.00,$0.00,Cleared
+Visa,,07/09/2025,Walmart,Needs: 🛒 Groceries,Needs,🛒 Groceries,,$200.00,$0.00,Cleared
+Visa,,07/19/2025,Costco,Needs: 🛒 Groceries,Needs,🛒 Groceries,,$150.00,$0.00,Cleared
+Visa,,07/21/2025,Cinema,Wants: 🍿 Movies,Wants,🍿 Movies,,$30.00,$0.00,Cleared
+Checking,,08/05/2025,Landlord,Needs: 🏠 Rent,Needs,🏠 Rent,,$1400.00,$0.00,Cleared
+Visa,,08/09/2025,Walmart,Needs: 🛒 Groceries,Needs,🛒 Groceries,,$420.50,$0.00,Cleared
+Visa,,08/12/2025,Cinema,Wants: 🍿 Movies,Wants,🍿 Movies,,$45.00,$0.00,Cleared
+"""
+
+def aggregates():
+    cube, _ = read_spending_csv(io.BytesIO(CSV_CONTENT.encode('utf-8')))
+    return SpendingAggregates(cube)
+
+@pytest.mark.asyncio
+async def test_category_total_for_month():
+    assert answer_query(aggregates(), "How much did I spend on groceries in August?") == \
+        "You spent $420.50 on 🛒 Groceries in August 2025."
+
+@pytest.mark.asyncio
+async def test_payee_and_relative_months():
+    spending = aggregates()
+
+    assert answer_query(spending, "how much did I spend at Walmart last month") == "You spent $200.00 on Walmart in July 2025."
+    assert answer_query(spending, "What was my spending this month?") == "You spent $1,865.50 in August 2025."
+
+@pytest.mark.asyncio
+async def test_group_total_across_all_months():
+    assert answer_query(aggregates(), "total spent on needs") == "You spent $3,570.50 on Needs across all months."
+
+@pytest.mark.asyncio
+async def test_top_payees():
+    assert answer_query(aggregates(), "top 2 payees in july") == \
+        "Top 2 payees by spending in July 2025:\n1. Landlord: $1,400.00\n2. Walmart: $200.00"
+
+@pytest.mark.asyncio
+async def test_month_over_month_delta():
+    spending = aggregates()
+
+    assert answer_query(spending, "compare groceries in July vs August") == \
+        "Spending on 🛒 Groceries was $350.00 in July 2025 and $420.50 in August 2025: up $70.50 (+20.1%)."
+    assert answer_query(spending, "how did my spending on movies change month over month in august") == \
+        "Spending on 🍿 Movies was $30.00 in July 2025 and $45.00 in August 2025: up $15.00 (+50.0%)."
+
+@pytest.mark.asyncio
+async def test_open_ended_questions_fall_back():
+    spending = aggregates()
+
+    assert answer_query(spending, "Why is my spending on groceries so high?") is None
+    assert answer_query(spending, "How much did I spend on unicorns in August?") is None
+    assert answer_query(spending, "Which purchases look unusual?") is None
+    assert answer_query(spending, "How much did I spend in March?") is None
+
+@pytest.mark.asyncio
+async def test_questions_with_unparsed_parts_fall_back():
+    spending = aggregates()
+
+    for question in ["How much did I spend on groceries in 2025?",
+                     "How much did I spend on rent last year?",
+                     "How much did I spend on groceries in the last 3 months?",
+                     "top 5 payees in 2025",
+                     "How much did I spend on rent and groceries?",
+                     "How much did I spend on rent vs groceries in August?",
+                     "How many times did I spend at Walmart?",
+                     "total number of purchases at Walmart",
+                     "How much money did I get from refunds in August?",
+                     "How much did Bre spend in August?"]:
+        assert answer_query(spending, question) is None, question
+
+@pytest.mark.asyncio
+async def test_router_counts_fast_path_hits():
+    router = QueryRouter()
+    spending = aggregates()
+
+    router.answer(spending, "top 3 categories")
+    router.answer(spending, "What should I cut back on?")
+    router.record(AGENT, 2.0)
+
+    assert router.stats[FAST_PATH]["count"] == 1
+    assert router.stats[AGENT] == {"count": 1, "seconds": 2.0}
+    assert router.hit_rate() == 0.5
+
+@pytest.mark.asyncio
+async def test_chat_reports_route(isolated_app):
+    class FakeAgent:
+        def invoke(self, inputs, config=None):
+            return {"output": "agent answer"}
+
+    isolated_app(create_agent=lambda llm, df, **kwargs: FakeAgent())
+    client = TestClient(main.app)
+    client.post("/uploadfile/", files={"csv_file": ("a.csv", CSV_CONTENT, "text/csv")}, data={"monthly_inflow": "3000"})
+
+    fast = client.post("/chat", json={"message": "How much did I spend on rent in July?"}).json()
+    slow = client.post("/chat", json={"message": "Any advice for next month?"}).json()
+
+    assert fast == {"response": "You spent $1,400.00 on 🏠 Rent in July 2025.", "route": "fast_path"}
+    assert slow == {"response": "agent answer", "route": "agent"}
+    assert main.query_router.hit_rate() == 0.5
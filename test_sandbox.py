@@ -0,0 +1,176 @@
+import os
+import pytest
+import threading
+import time
+import pandas as pd
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+import main
+import instrumentation
+import sandbox as sandbox_module
+from sandbox import PythonSandbox, sanitize_snippet
+
+CSV_CONTENT = """Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared
+Test Account,,08/01/2025,Paycheck,Income: Salary,Income,Salary,,$0.00,$2000.00,Cleared
+Test Account,,08/05/2025,Rent,Needs: Housing,Needs,Housing,,$1000.00,$0.00,Cleared
+Test Account,,08/15/2025,Concert,Wants: Entertainment,Wants,Entertainment,,$150.00,$0.00,Cleared
+"""
+
+@pytest.fixture(scope="module")
+def sandbox(tmp_path_factory):
+    # One pool for the module, since each spawned worker has to import pandas
+    sandbox = PythonSandbox(str(tmp_path_factory.mktemp("sandbox")), max_workers=1, cpu_seconds=1,
+                            memory_bytes=256 * 1024 * 1024, timeout=5)
+    yield sandbox
+    sandbox.shutdown()
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({'Category': pd.Categorical(['Rent', 'Food', 'Food']), 'Outflow': [100000, 2500, 1250]})
+
+@pytest.fixture
+def counters():
+    instrumentation.metrics.reset()
+    return lambda: instrumentation.metrics.snapshot()["counters"]
+
+@pytest.mark.asyncio
+async def test_snippet_output_matches_the_stock_tool(sandbox, frame):
+    assert sandbox.run("v1", frame, "df['Outflow'].sum()") == "103750"
+    assert sandbox.run("v1", frame, "```python\nprint(len(df))\ntotal = df.groupby('Category', observed=True)['Outflow'].sum()\ntotal['Food']\n```") == "3\n3750"
+    assert sandbox.run("v1", frame, "x = 1") == ""
+    assert sandbox.run("v1", frame, "df['Missing']") == "KeyError: 'Missing'"
+
+@pytest.mark.asyncio
+async def test_results_are_memoized_per_dataset_version(sandbox, frame, counters):
+    sandbox.run("v1", frame, "df['Outflow'].max()")
+    sandbox.run("v1", frame, "  df['Outflow'].max()\n")
+    appended = pd.concat([frame, frame.tail(1).assign(Outflow=999999)], ignore_index=True)
+
+    assert sandbox.run("v2", appended, "df['Outflow'].max()") == "999999"
+    assert counters()["sandbox.cache_hits"] == 1
+    assert counters()["sandbox.cache_misses"] == 2
+
+@pytest.mark.asyncio
+async def test_snippets_cannot_change_the_data(sandbox, frame):
+    assert sandbox.run("v1", frame, "df['Outflow'].to_numpy()[0] = 0").startswith("ValueError")
+    sandbox.run("v1", frame, "df['Extra'] = 1")
+
+    assert sandbox.run("v1", frame, "(df['Outflow'].iloc[0], 'Extra' in df)") == "(np.int64(100000), False)"
+    assert frame['Outflow'].iloc[0] == 100000
+
+@pytest.mark.asyncio
+async def test_runaway_snippets_are_stopped(sandbox, frame, counters):
+    assert "CPU time limit" in sandbox.run("v1", frame, "while True: pass")
+    assert "memory limit" in sandbox.run("v1", frame, "blocks = [bytearray(64 * 1024 * 1024) for _ in range(8)]")
+    assert "within 5 seconds" in sandbox.run("v1", frame, "import time; time.sleep(60)")
+
+    assert counters()["sandbox.limit_exceeded"] == 3
+    assert sandbox.run("v1", frame, "len(df)") == "3"
+
+@pytest.mark.asyncio
+async def test_errors_are_not_memoized(sandbox, frame, counters):
+    sandbox.run("v1", frame, "df['Missing']")
+
+    assert sandbox.run("v1", frame, "df['Missing']") == "KeyError: 'Missing'"
+    assert counters()["sandbox.cache_misses"] == 2
+    assert "sandbox.cache_hits" not in counters()
+
+@pytest.mark.asyncio
+async def test_names_carry_over_between_an_agents_snippets(sandbox, frame, counters):
+    python = sandbox.session("chain", frame)
+    python.run("monthly = df.groupby('Category', observed=True)['Outflow'].sum()")
+    python.run("df['Share'] = df['Outflow'] / df['Outflow'].sum()")
+
+    assert python.run("monthly.max()") == "100000"
+    assert python.run("round(df['Share'].sum(), 2)") == "1.0"
+    assert sandbox.session("chain", frame).run("monthly.max()") == "NameError: name 'monthly' is not defined"
+    # Snippets that read none of the names earlier ones bound are shared between agents
+    python.run("monthly.max()")
+    sandbox.session("chain", frame).run("df['Outflow'].max()")
+    sandbox.session("chain", frame).run("df['Outflow'].max()")
+    assert counters()["sandbox.cache_hits"] == 2
+
+@pytest.mark.asyncio
+async def test_a_timeout_does_not_fail_other_snippets(tmp_path, frame, counters):
+    sandbox = PythonSandbox(str(tmp_path), max_workers=2, cpu_seconds=30, timeout=3)
+    try:
+        sandbox.run("v1", frame, "len(df)")
+        start = time.time()
+        stuck = threading.Thread(target=sandbox.run, args=("v1", frame, "import time; time.sleep(60)"))
+        stuck.start()
+        time.sleep(0.5)
+        # Still running when the stuck snippet's pool is killed, and quick once run again
+        result = sandbox.run("v1", frame, f"import time\ntime.sleep(max(0, {start + 3.5} - time.time()))\nlen(df)")
+        stuck.join()
+
+        assert result == "3"
+        assert counters()["sandbox.limit_exceeded"] == 1
+    finally:
+        sandbox.shutdown()
+
+def _failed_start(memory_bytes, pids):
+    raise OSError("cannot allocate memory")
+
+@pytest.mark.asyncio
+async def test_mapped_frames_do_not_count_against_the_snippet(tmp_path, counters):
+    # The frame alone is larger than what a snippet may allocate
+    large = pd.DataFrame({'Outflow': range(8_000_000)})
+    sandbox = PythonSandbox(str(tmp_path), max_workers=1, memory_bytes=32 * 1024 * 1024)
+    try:
+        assert sandbox.run("large", large, "df['Outflow'].max()") == "7999999"
+        assert "memory limit" in sandbox.run("large", large, "blocks = [bytearray(16 * 1024 * 1024) for _ in range(4)]")
+    finally:
+        sandbox.shutdown()
+
+@pytest.mark.asyncio
+async def test_frame_load_failures_are_tool_errors(tmp_path, frame, counters):
+    sandbox = PythonSandbox(str(tmp_path), max_workers=1)
+    try:
+        column = os.path.join(sandbox.publish("broken", frame), "0.npy")
+        os.remove(column)
+        os.mkdir(column)
+
+        assert sandbox.run("broken", frame, "len(df)").startswith("Error: the data could not be loaded for the code (IsADirectoryError")
+        assert counters()["sandbox.frame_errors"] == 1
+        assert sandbox.run("v1", frame, "len(df)") == "3"
+        assert "sandbox.limit_exceeded" not in counters()
+    finally:
+        sandbox.shutdown()
+
+@pytest.mark.asyncio
+async def test_a_failed_start_is_not_a_limit_breach(tmp_path, frame, counters, monkeypatch):
+    monkeypatch.setattr(sandbox_module, "_start_worker", _failed_start)
+    sandbox = PythonSandbox(str(tmp_path), max_workers=1)
+    try:
+        assert sandbox.run("v1", frame, "len(df)") == "Error: the Python sandbox could not start; try again later."
+        assert counters()["sandbox.start_failures"] == 1
+        assert "sandbox.limit_exceeded" not in counters()
+    finally:
+        sandbox.shutdown()
+
+@pytest.mark.asyncio
+async def test_sanitize_strips_markdown_fences():
+    assert sanitize_snippet("```python\ndf.head()\n```") == "df.head()"
+    assert sanitize_snippet(" `len(df)` ") == "len(df)"
+
+@pytest.mark.asyncio
+async def test_agent_code_runs_in_the_sandbox(isolated_app, monkeypatch, sandbox, counters):
+    responses = ["Thought: sum\nAction: python_repl_ast\nAction Input: df['Outflow'].sum()",
+                 "Thought: done\nFinal Answer: done"]
+    isolated_app(lambda **kwargs: FakeListChatModel(responses=responses))
+    monkeypatch.setattr(main, "python_sandbox", sandbox)
+    alice, bob = TestClient(main.app), TestClient(main.app)
+    for client in (alice, bob):
+        client.post("/uploadfile/", files={"csv_file": ("a.csv", CSV_CONTENT, "text/csv")}, data={"monthly_inflow": "2000"})
+        assert client.post("/chat", json={"message": "Which purchases look unusual?"}).json()["response"] == "done"
+
+    # Both sessions hold the same upload, so the second agent's snippet comes from the cache
+    assert counters()["sandbox.cache_misses"] == 1
+    assert counters()["sandbox.cache_hits"] == 1
+    session = main.sessions.get(alice.cookies["session_id"])
+    assert session.agent.tools[0].func("df['Outflow'].sum()") == "115000"
+
+    append = "Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared\n" \
+             "Test Account,,08/20/2025,Cafe,Wants: Dining,Wants,Dining,,$5.00,$0.00,Cleared\n"
+    alice.post("/transactions/append", files={"csv_file": ("b.csv", append, "text/csv")})
+    assert main.session_agent(session).tools[0].func("df['Outflow'].sum()") == "115500"
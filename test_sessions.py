@@ -0,0 +1,88 @@
+import pytest
+import pandas as pd
+from fastapi.testclient import TestClient
+import main
+from sessions import SessionStore, SESSION_COOKIE
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def frame_of(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({'Outflow': [1.0] * rows})
+
+@pytest.mark.asyncio
+async def test_get_or_create_reuses_live_session():
+    store = SessionStore(memory_factory=list)
+    session = store.get_or_create()
+
+    assert store.get_or_create(session.token) is session
+    assert store.get_or_create("unknown-token") is not session
+    assert session.memory == []
+
+@pytest.mark.asyncio
+async def test_sessions_expire_after_ttl():
+    clock = FakeClock()
+    store = SessionStore(ttl_seconds=60, clock=clock)
+    session = store.get_or_create()
+
+    clock.now = 59
+    assert store.get(session.token) is session
+    clock.now = 119
+    assert store.get(session.token) is session
+    clock.now = 180
+    assert store.get(session.token) is None
+    assert len(store) == 0
+
+@pytest.mark.asyncio
+async def test_memory_budget_evicts_least_recently_used():
+    one_session_bytes = SessionStore().get_or_create().footprint() + frame_of(1000).memory_usage(deep=True).sum()
+    store = SessionStore(memory_budget_bytes=int(one_session_bytes * 2.5))
+    first, second, third = store.get_or_create(), store.get_or_create(), store.get_or_create()
+    for session in (first, second):
+        session.df = frame_of(1000)
+        store.update_footprint(session)
+
+    store.get(first.token)
+    third.df = frame_of(1000)
+    store.update_footprint(third)
+
+    assert first.token in store
+    assert second.token not in store
+    assert third.token in store
+    assert store.total_bytes == first.nbytes + third.nbytes
+
+@pytest.mark.asyncio
+async def test_session_count_is_bounded():
+    store = SessionStore(max_sessions=3)
+    tokens = [store.get_or_create().token for _ in range(5)]
+
+    assert len(store) == 3
+    assert [token in store for token in tokens] == [False, False, True, True, True]
+
+@pytest.mark.asyncio
+async def test_uploads_do_not_bleed_between_sessions(isolated_app):
+    class FakeAgent:
+        def __init__(self, df):
+            self.df = df
+
+        def invoke(self, inputs, config=None):
+            return {"output": f"{len(self.df)} rows"}
+
+    isolated_app(create_agent=lambda llm, df, **kwargs: FakeAgent(df))
+
+    header = "Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared\n"
+    row = "Test Account,,08/05/2025,Rent,Needs: Housing,Needs,Housing,,$10.00,$0.00,Cleared\n"
+    alice, bob = TestClient(main.app), TestClient(main.app)
+
+    assert alice.post("/chat", json={"message": "hi"}).json() == {"response": "Please upload a CSV file first."}
+    alice.post("/uploadfile/", files={"csv_file": ("a.csv", header + row * 2, "text/csv")}, data={"monthly_inflow": "100"})
+    bob.post("/uploadfile/", files={"csv_file": ("b.csv", header + row * 5, "text/csv")}, data={"monthly_inflow": "100"})
+
+    assert alice.cookies[SESSION_COOKIE] != bob.cookies[SESSION_COOKIE]
+    assert alice.post("/chat", json={"message": "how many rows?"}).json() == {"response": "2 rows", "route": "agent"}
+    assert bob.post("/chat", json={"message": "how many rows?"}).json() == {"response": "5 rows", "route": "agent"}
+    assert len(main.sessions) == 2
@@ -104,4 +104,42 @@ Test Account,,08/10/2025,Refund,Income: Refund,Income,Refund,,$0.00,$50.00,Clear
     assert summary["wants_spent"] == 0.00
     assert summary["other_spent"] == 0.00
     assert "Info: In August 2025, your net spending ($-850.00) was within your monthly inflow ($1000.00)." in summary["recommendations"]
-    assert "Info: In August 2025, your Needs and Wants spending adhered to the 50/30 rule relative to your inflow." in summary["recommendations"]
\ No newline at end of file
+    assert "Info: In August 2025, your Needs and Wants spending adhered to the 50/30 rule relative to your inflow." in summary["recommendations"]
+
+@pytest.mark.asyncio
+async def test_summary_without_inflow_and_ungrouped_rows():
+    csv_content = """
+Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared
+Test Account,,12/31/2024,Rent,Needs: Housing,Needs,Housing,,$900.00,$0.00,Cleared
+Test Account,,01/02/2025,Transfer,,,,,$75.00,$0.00,Cleared
+Test Account,,01/03/2025,Concert,Wants: Entertainment,Wants,Entertainment,,$25.00,$0.00,Cleared
+"""
+
+    df = pd.read_csv(io.BytesIO(csv_content.encode('utf-8')))
+    monthly_summary = process_spending_data(df, 0.0)
+
+    assert [summary["month"] for summary in monthly_summary] == ["December 2024", "January 2025"]
+    summary_january = monthly_summary[1]
+    assert summary_january["total_net_spent"] == 100.00
+    assert summary_january["wants_spent"] == 25.00
+    assert summary_january["other_spent"] == 75.00
+    assert summary_january["recommendations"] == [
+        "Info: Monthly inflow not provided, cannot compare spending for January 2025.",
+        "Info: Monthly inflow not provided, cannot assess 50/30 rule for January 2025.",
+    ]
+
+@pytest.mark.asyncio
+async def test_summary_then_50_30_on_the_same_frame():
+    csv_content = """Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared
+Test Account,,08/05/2025,Rent,Needs: Housing,Needs,Housing,,$100.00,$0.00,Cleared
+Test Account,,08/15/2025,Concert,Wants: Entertainment,Wants,Entertainment,,$50.00,$0.00,Cleared
+"""
+    df = pd.read_csv(io.StringIO(csv_content))
+
+    monthly_summary = process_spending_data(df, 1000.0)
+    recommendations = calculate_50_30_recommendations(df, 1000.0)
+
+    assert monthly_summary[0]["total_net_spent"] == 150.00
+    assert df['Outflow'].tolist() == [100.00, 50.00]
+    assert "Great job! Your spending on Needs and Wants is within the recommended 50/30 rule relative to your inflow." in recommendations
+    assert "You have a surplus of $850.00 this month. Consider saving or investing this amount." in recommendations
@@ -0,0 +1,59 @@
+import pytest
+import io
+import json
+import pandas as pd
+import bench_suite
+import main
+from ingestion import read_spending_csv
+from synthetic_data import write_export, generate_transactions, CATEGORIES
+
+SAMPLE_CSV = "ynab-reflect-spending-breakdown-2025-09-01-transactions.csv"
+
+def export_text(rows: int, **options) -> str:
+    buffer = io.StringIO()
+    write_export(buffer, rows, **options)
+    return buffer.getvalue()
+
+@pytest.mark.asyncio
+async def test_export_matches_sample_layout():
+    text = export_text(500, chunk_rows=200)
+    with open(SAMPLE_CSV, encoding="utf-8") as f:
+        sample_header = f.readline()
+    sample = pd.read_csv(SAMPLE_CSV, dtype=object)
+    generated = pd.read_csv(io.StringIO(text), dtype=object)
+
+    assert text.splitlines()[0] == sample_header.rstrip("\n")
+    assert list(generated.columns) == list(sample.columns)
+    assert set(generated['Category Group']) <= set(sample['Category Group'])
+    assert generated['Outflow'].str.fullmatch(r'\$\d+\.\d\d').all()
+    assert generated['Inflow'].str.fullmatch(r'\$\d+\.\d\d').all()
+    assert pd.to_datetime(generated['Date'], format='%m/%d/%Y').is_monotonic_decreasing
+
+@pytest.mark.asyncio
+async def test_export_parses_without_dropping_rows():
+    cube, df = read_spending_csv(io.BytesIO(export_text(2_000, chunk_rows=700).encode('utf-8')))
+
+    assert len(df) == 2_000
+    assert cube.rows == 2_000
+    assert (df['Outflow'] > 0).sum() + (df['Inflow'] > 0).sum() == 2_000
+
+@pytest.mark.asyncio
+async def test_generator_is_deterministic():
+    pd.testing.assert_frame_equal(generate_transactions(300, seed=7), generate_transactions(300, seed=7))
+    assert not generate_transactions(300, seed=7).equals(generate_transactions(300, seed=8))
+    assert len(CATEGORIES) == len({category[1] for category in CATEGORIES})
+
+@pytest.mark.asyncio
+async def test_bench_suite_records_every_stage(monkeypatch, tmp_path):
+    # The suite swaps in its own LLM, cache and sessions; restore them afterwards
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    for name in ["shared_llm", "upload_cache", "sessions"]:
+        monkeypatch.setattr(main, name, getattr(main, name))
+    report = bench_suite.run_suite([1_000], repeat=1, data_dir=str(tmp_path), progress=lambda line: None)
+
+    assert [result["stage"] for result in report["results"]] == bench_suite.STAGES
+    for result in report["results"]:
+        assert result["rows"] == 1_000
+        assert result["seconds"] > 0
+        assert result["peak_bytes"] > 0
+    assert json.loads(json.dumps(report)) == report
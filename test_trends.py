@@ -0,0 +1,138 @@
+import pytest
+import io
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+import main
+from ingestion import clean_spending_frame
+from query_router import SpendingAggregates, answer_query
+from synthetic_data import generate_transactions
+from trends import TrendEngine, TOTALS
+from cube import SpendingCube
+
+HEADER = "Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared\n"
+
+def monthly_history(groceries, start_month: int = 1, year: int = 2024) -> str:
+    """An export with a paycheck, rent and the given grocery spending in consecutive months."""
+    rows = []
+    for i, amount in enumerate(groceries):
+        month = start_month + i
+        date = f"{(month - 1) % 12 + 1:02d}/05/{year + (month - 1) // 12}"
+        rows.append(f"Checking,,{date},Paycheck,Inflow: Ready to Assign,Inflow,Ready to Assign,,$0.00,$3000.00,Cleared")
+        rows.append(f"Checking,,{date},Landlord,Needs: Rent,Needs,Rent,,$1400.00,$0.00,Cleared")
+        rows.append(f"Visa,,{date},Walmart,Needs: Groceries,Needs,Groceries,,${amount:.2f},$0.00,Cleared")
+    return HEADER + "\n".join(rows) + "\n"
+
+def read(csv: str) -> pd.DataFrame:
+    df = pd.read_csv(io.StringIO(csv), dtype=object)
+    clean_spending_frame(df)
+    return df
+
+def aggregates(csv: str) -> SpendingAggregates:
+    cube = SpendingCube.from_frame(read(csv))
+    return SpendingAggregates(cube, TrendEngine.from_cube(cube))
+
+def cleaned(rows: int = 5_000, seed: int = 3) -> pd.DataFrame:
+    df = generate_transactions(rows, seed=seed, days=3 * 365)
+    clean_spending_frame(df)
+    return df.sort_values(['Year', 'Month'], kind='stable').reset_index(drop=True)
+
+def pandas_rolling(df: pd.DataFrame, dimension: str, window: int) -> pd.DataFrame:
+    period = df['Year'].astype(int) * 12 + df['Month'].astype(int) - 1
+    table = df.assign(period=period).pivot_table(index=dimension, columns='period', values='Outflow',
+                                                  aggfunc='sum', fill_value=0, observed=True)
+    table = table.reindex(columns=range(period.min(), period.max() + 1), fill_value=0)
+    return table.T.rolling(window).mean().T
+
+@pytest.mark.asyncio
+async def test_rolling_averages_match_pandas():
+    df = cleaned()
+    engine = TrendEngine()
+    engine.append(df)
+
+    for dimension in ['Category', 'Category Group']:
+        for window in (3, 6, 12):
+            expected = pandas_rolling(df, dimension, window)
+            actual = engine.rolling(dimension, window).loc[expected.index]
+            np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), equal_nan=True)
+    inflow = df.groupby(['Year', 'Month'])['Inflow'].sum().to_numpy()
+    np.testing.assert_array_equal(engine.monthly(TOTALS, 'inflow'), inflow)
+
+@pytest.mark.asyncio
+async def test_month_by_month_appends_match_one_pass():
+    df = cleaned()
+    whole = TrendEngine()
+    whole.append(df)
+    # Months arrive in order, then a late export backfills the first month
+    incremental = TrendEngine()
+    months = [group for _, group in df.groupby(['Year', 'Month'], sort=True)]
+    for group in months[1:]:
+        incremental.append(group)
+    incremental.append(months[0])
+
+    assert (incremental.start, incremental.months) == (whole.start, whole.months)
+    for dimension in ['Category', 'Category Group', TOTALS]:
+        for name in whole.tables[dimension].names:
+            np.testing.assert_array_equal(incremental.monthly(dimension, name), whole.monthly(dimension, name))
+            assert incremental.averages(dimension, name) == pytest.approx(whole.averages(dimension, name))
+    assert incremental.anomalies() == whole.anomalies()
+
+@pytest.mark.asyncio
+async def test_gap_months_carry_running_sums():
+    engine = TrendEngine()
+    cube = SpendingCube.from_frame(read(monthly_history([100, 100, 100])))
+    engine.append(cube.to_frame().rename(columns={'outflow': 'Outflow', 'inflow': 'Inflow'}))
+    engine.append(read(monthly_history([300], start_month=6)))
+
+    assert engine.months == 6
+    assert engine.averages('Category', 'Groceries') == {3: 10000.0, 6: 10000.0, 12: None}
+
+@pytest.mark.asyncio
+async def test_spending_spikes_are_anomalies():
+    engine = TrendEngine.from_cube(SpendingCube.from_frame(read(monthly_history([200, 210, 190, 205, 195, 200, 650]))))
+
+    anomalies = engine.anomalies()
+    assert [(anomaly["dimension"], anomaly["name"], anomaly["month"], anomaly["spent"], anomaly["typical"])
+            for anomaly in anomalies] == [("Category", "Groceries", "July 2024", 650.0, 200.0),
+                                          ("Category Group", "Needs", "July 2024", 2050.0, 1600.0)]
+
+@pytest.mark.asyncio
+async def test_trend_questions_take_the_fast_path():
+    spending = aggregates(monthly_history([100, 200, 300, 400, 500, 600, 1500]))
+    facts = {}
+
+    assert answer_query(spending, "What is my 3-month average spending on groceries?", facts) == \
+        "Your average monthly spending on Groceries to July 2024 was $866.67 over 3 months."
+    assert answer_query(spending, "average spending on needs in june") == \
+        "Your average monthly spending on Needs to June 2024 was $1,900.00 over 3 months, $1,750.00 over 6 months."
+    assert answer_query(spending, "How much did I earn in July?") == "Your inflow was $3,000.00 in July 2024."
+    assert answer_query(spending, "what was my average income") == \
+        "Your average monthly inflow to July 2024 was $3,000.00 over 3 months, $3,000.00 over 6 months."
+    assert answer_query(spending, "Any unusual spending?").startswith("Unusual spending in the last 12 months:\n- Groceries in July 2024")
+    assert facts == {"Average monthly spending on Groceries over 3 months to July 2024": "$866.67"}
+
+    assert answer_query(spending, "Which purchases look unusual?") is None
+    assert answer_query(spending, "How can I reduce my average grocery spending?") is None
+    assert answer_query(spending, "average spending at Walmart") is None
+
+@pytest.mark.asyncio
+async def test_upload_and_append_return_trends(isolated_app):
+    isolated_app()
+    client = TestClient(main.app)
+
+    history = monthly_history([200, 210, 190, 205, 195, 200])
+    trends = client.post("/uploadfile/", files={"csv_file": ("h.csv", history, "text/csv")},
+                         data={"monthly_inflow": "3000"}).json()["trends"]
+    assert trends["latest_month"] == "June 2024"
+    assert trends["inflow"]["average"] == {"3_month": 3000.0, "6_month": 3000.0, "12_month": None}
+    assert trends["rolling"]["Category Group"][0]["name"] == "Needs"
+    assert trends["anomalies"] == []
+
+    delta = monthly_history([650], start_month=7)
+    result = client.post("/transactions/append", files={"csv_file": ("d.csv", delta, "text/csv")}).json()
+    assert result["trends"]["latest_month"] == "July 2024"
+    assert [anomaly["name"] for anomaly in result["trends"]["anomalies"]] == ["Groceries", "Needs"]
+
+    chat = client.post("/chat", json={"message": "Show me any spending spikes"}).json()
+    assert chat["route"] == "fast_path"
+    assert chat["response"].startswith("Unusual spending in the last 12 months:\n- Groceries in July 2024: $650.00")
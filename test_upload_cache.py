@@ -0,0 +1,97 @@
+import pytest
+import io
+import os
+import time
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+import main
+from ingestion import read_spending_csv
+from upload_cache import UploadCache, content_key
+
+CSV_CONTENT = """Account,Flag,Date,Payee,Category Group/Category,Category Group,Category,Memo,Outflow,Inflow,Cleared
+Test Account,,07/01/2025,Paycheck,Income: Salary,Income,Salary,,$0.00,$1500.00,Cleared
+Test Account,,07/05/2025,Rent,Needs: Housing,Needs,Housing,,$800.00,$0.00,Cleared
+Test Account,,08/03/2025,Transfer,,,,,$20.00,$0.00,Cleared
+Test Account,,08/09/2025,Concert,Wants: Entertainment,Wants,Entertainment,,$45.50,$0.00,Cleared
+"""
+
+@pytest.mark.asyncio
+async def test_content_key_rewinds_stream():
+    file = io.BytesIO(CSV_CONTENT.encode('utf-8'))
+
+    key = content_key(file)
+
+    assert key == content_key(io.BytesIO(CSV_CONTENT.encode('utf-8')))
+    assert key != content_key(io.BytesIO(CSV_CONTENT.replace("45.50", "45.51").encode('utf-8')))
+    assert file.read() == CSV_CONTENT.encode('utf-8')
+
+@pytest.mark.asyncio
+async def test_round_trip_loads_memory_mapped_frame(tmp_path):
+    cache = UploadCache(str(tmp_path))
+    cube, df = read_spending_csv(io.BytesIO(CSV_CONTENT.encode('utf-8')))
+
+    assert cache.load("missing") is None
+    cache.store("abc", cube, df)
+    cached_cube, cached_df = cache.load("abc")
+
+    pd.testing.assert_frame_equal(cached_cube.monthly_totals(), cube.monthly_totals())
+    assert cached_cube.rows == cube.rows
+    assert list(cached_df.columns) == list(df.columns)
+    assert cached_df['Outflow'].tolist() == df['Outflow'].tolist()
+    assert cached_df['Date'].tolist() == df['Date'].tolist()
+    assert cached_df['Category Group'].astype(object).where(cached_df['Category Group'].notna(), None).tolist() == \
+        ['Income', 'Needs', None, 'Wants']
+    # Numeric columns are views onto the cached files rather than copies
+    base = cached_df['Outflow'].to_numpy()
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert base is not None
+
+@pytest.mark.asyncio
+async def test_recommendations_cached_per_inflow(tmp_path):
+    cache = UploadCache(str(tmp_path))
+    cube, df = read_spending_csv(io.BytesIO(CSV_CONTENT.encode('utf-8')))
+    cache.store("abc", cube, df)
+
+    cache.store_recommendations("abc", 1500.0, ["fifteen hundred"])
+
+    assert cache.load_recommendations("abc", 1500.0) == ["fifteen hundred"]
+    assert cache.load_recommendations("abc", 2000.0) is None
+
+@pytest.mark.asyncio
+async def test_size_bound_evicts_least_recently_used(tmp_path):
+    cube, df = read_spending_csv(io.BytesIO(CSV_CONTENT.encode('utf-8')))
+    probe = UploadCache(str(tmp_path / "probe"))
+    probe.store("probe", cube, df)
+    entry_bytes = sum(path.stat().st_size for path in (tmp_path / "probe" / "probe").rglob("*") if path.is_file())
+
+    cache = UploadCache(str(tmp_path / "cache"), max_bytes=int(entry_bytes * 2.5))
+    cache.store("first", cube, df)
+    cache.store("second", cube, df)
+    # Touch "first" so "second" becomes the least recently used
+    os.utime(tmp_path / "cache" / "second", (time.time() - 60, time.time() - 60))
+    cache.load("first")
+    cache.store("third", cube, df)
+
+    assert cache.load("first") is not None
+    assert cache.load("second") is None
+    assert cache.load("third") is not None
+
+@pytest.mark.asyncio
+async def test_repeat_upload_served_from_cache(isolated_app, monkeypatch):
+    isolated_app(create_agent=lambda llm, df, **kwargs: object())
+    client = TestClient(main.app)
+
+    def upload():
+        return client.post("/uploadfile/", files={"csv_file": ("a.csv", CSV_CONTENT, "text/csv")},
+                           data={"monthly_inflow": "1500"}).json()
+
+    first = upload()
+    parses = []
+    monkeypatch.setattr(main, "read_spending_csv", lambda *args, **kwargs: parses.append(args))
+    second = upload()
+
+    assert "recommendations" in first
+    assert second == first
+    assert parses == []
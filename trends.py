@@ -0,0 +1,257 @@
+import calendar
+import os
+import numpy as np
+import pandas as pd
+from instrumentation import span
+
+# Rolling average windows, in months
+ROLLING_WINDOWS = (3, 6, 12)
+TREND_DIMENSIONS = ['Category Group', 'Category']
+TOTALS = 'Totals'
+
+# Anomaly detection, overridable per deployment: a month is flagged when its spending is at least
+# ANOMALY_Z standard deviations and ANOMALY_MIN_EXCESS_CENTS above the months before it
+ANOMALY_Z = float(os.environ.get("ANOMALY_Z", 2.5))
+ANOMALY_MIN_EXCESS_CENTS = int(os.environ.get("ANOMALY_MIN_EXCESS_CENTS", 2500))
+ANOMALY_HISTORY_MONTHS = 12
+ANOMALY_MIN_HISTORY_MONTHS = 6
+# Months the report looks back over for anomalies, and how many it lists
+ANOMALY_LOOKBACK_MONTHS = 12
+MAX_ANOMALIES = 10
+
+
+def period_name(period: int) -> str:
+    return f"{calendar.month_name[period % 12 + 1]} {period // 12}"
+
+
+def _dollars(cents):
+    return None if cents is None or np.isnan(cents) else round(float(cents) / 100, 2)
+
+
+class _Table:
+    """Monthly sums (in cents) for the names of one dimension, with their running sums.
+
+    Row i of sums is name i's spending per month; prefix[i, m] is its total over the months
+    before m, and prefix_sq the same for squares, so any window's mean and variance is two
+    subtractions. Both grow with headroom, like the cube's arrays.
+    """
+
+    def __init__(self):
+        self.names = []
+        self._codes = {}
+        self.sums = np.zeros((0, 0))
+        self.prefix = np.zeros((0, 1))
+        self.prefix_sq = np.zeros((0, 1))
+
+    def encode(self, values) -> np.ndarray:
+        local_codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        mapping = np.empty(len(uniques), dtype=np.int64)
+        for i, value in enumerate(uniques):
+            key = None if pd.isna(value) else value
+            code = self._codes.get(key)
+            if code is None:
+                code = self._codes[key] = len(self.names)
+                self.names.append(key)
+            mapping[i] = code
+        return mapping[local_codes]
+
+    def reserve(self, months: int, shift: int):
+        """Make room for the names seen so far and months columns, moving history right by shift."""
+        rows, capacity = self.sums.shape
+        needed_rows = len(self.names)
+        if needed_rows > rows or months > capacity:
+            rows = max(needed_rows, rows * 2, 8) if needed_rows > rows else rows
+            capacity = max(months, capacity * 2, 24) if months > capacity else capacity
+            for name in ('sums', 'prefix', 'prefix_sq'):
+                array = getattr(self, name)
+                grown = np.zeros((rows, capacity + (name != 'sums')))
+                grown[:array.shape[0], :array.shape[1]] = array
+                setattr(self, name, grown)
+        if shift:
+            # An export reaching further back than any before; rare, so the history is moved
+            used = months - shift
+            self.sums[:, shift:months] = self.sums[:, :used].copy()
+            self.sums[:, :shift] = 0
+
+    def add(self, codes: np.ndarray, columns: np.ndarray, cents: np.ndarray, first: int, months: int, dirty: int):
+        """Add cents at (codes, columns), columns >= first, then refresh the running sums from column dirty on."""
+        rows, span_ = len(self.names), months - first
+        bins = np.bincount(codes * span_ + (columns - first), weights=cents, minlength=rows * span_)
+        self.sums[:rows, first:months] += bins.reshape(rows, span_)
+        window = self.sums[:rows, dirty:months]
+        self.prefix[:rows, dirty + 1:months + 1] = self.prefix[:rows, dirty:dirty + 1] + np.cumsum(window, axis=1)
+        self.prefix_sq[:rows, dirty + 1:months + 1] = self.prefix_sq[:rows, dirty:dirty + 1] + np.cumsum(window ** 2, axis=1)
+
+
+class TrendEngine:
+    """Rolling averages, actual inflow and spending anomalies per month, updated as exports arrive.
+
+    Spending is kept per Category and Category Group as a names x months matrix with running
+    sums, alongside total outflow and inflow. append() adds only the delta's months and
+    refreshes the running sums from the earliest month it touched, so a new month of data
+    costs the same however long the history is. Rolling means and z-scores are then
+    differences of running sums over any window.
+    """
+
+    def __init__(self):
+        self.start = None
+        self.months = 0
+        self.version = 0
+        self.tables = {dimension: _Table() for dimension in TREND_DIMENSIONS + [TOTALS]}
+        self.tables[TOTALS].encode(np.array(['outflow', 'inflow'], dtype=object))
+
+    @classmethod
+    def from_cube(cls, cube) -> "TrendEngine":
+        # The cube's cells are already summed per month, so this reads far fewer rows than the upload
+        cells = cube.to_frame()
+        engine = cls()
+        engine.append(cells.rename(columns={'outflow': 'Outflow', 'inflow': 'Inflow'}))
+        return engine
+
+    @property
+    def nbytes(self) -> int:
+        return sum(table.sums.nbytes + table.prefix.nbytes + table.prefix_sq.nbytes for table in self.tables.values())
+
+    @property
+    def latest(self):
+        return self.start + self.months - 1 if self.months else None
+
+    def append(self, df: pd.DataFrame):
+        """Fold cleaned transactions (Outflow/Inflow in int cents) into the trends."""
+        if len(df) == 0:
+            return
+        with span("aggregate.trends"):
+            self._append(df)
+
+    def _append(self, df: pd.DataFrame):
+        period = df['Year'].to_numpy(dtype=np.int64) * 12 + df['Month'].to_numpy(dtype=np.int64) - 1
+        low, high = int(period.min()), int(period.max())
+        previous = self.months
+        shift = 0
+        if self.start is None:
+            self.start = low
+        elif low < self.start:
+            shift, self.start = self.start - low, low
+        self.months = max(previous + shift, high - self.start + 1)
+        columns = period - self.start
+        first = low - self.start
+        # Months between the old end and first have no data but still need running sums carried over
+        dirty = 0 if shift else min(first, previous)
+
+        outflow = df['Outflow'].to_numpy(dtype=np.float64)
+        for dimension in TREND_DIMENSIONS:
+            table = self.tables[dimension]
+            codes = table.encode(df[dimension]) if dimension in df.columns else \
+                table.encode(np.full(len(df), None, dtype=object))
+            table.reserve(self.months, shift)
+            table.add(codes, columns, outflow, first, self.months, dirty)
+
+        totals = self.tables[TOTALS]
+        totals.reserve(self.months, shift)
+        codes = np.concatenate([np.zeros(len(df), dtype=np.int64), np.ones(len(df), dtype=np.int64)])
+        totals.add(codes, np.concatenate([columns, columns]),
+                   np.concatenate([outflow, df['Inflow'].to_numpy(dtype=np.float64)]), first, self.months, dirty)
+        self.version += 1
+
+    def _row(self, dimension: str, name):
+        table = self.tables[dimension]
+        code = table._codes.get(name)
+        return table, code
+
+    def monthly(self, dimension: str, name) -> np.ndarray:
+        """Cents per month from the first month on, e.g. monthly(TOTALS, 'inflow')."""
+        table, code = self._row(dimension, name)
+        if code is None:
+            return np.zeros(self.months)
+        return table.sums[code, :self.months]
+
+    def averages(self, dimension: str, name, end: int = None) -> dict:
+        """Mean monthly cents over each rolling window ending at month end (the latest by default).
+
+        A window reaching back before the first month has no average.
+        """
+        table, code = self._row(dimension, name)
+        end = (self.latest if end is None else end) - self.start + 1
+        result = {}
+        for window in ROLLING_WINDOWS:
+            if code is None or end < window or end > self.months:
+                result[window] = None
+            else:
+                result[window] = (table.prefix[code, end] - table.prefix[code, end - window]) / window
+        return result
+
+    def rolling(self, dimension: str, window: int) -> pd.DataFrame:
+        """Rolling mean cents for every name (rows) and month (columns); NaN before a full window."""
+        table = self.tables[dimension]
+        rows = len(table.names)
+        means = np.full((rows, self.months), np.nan)
+        if self.months >= window:
+            means[:, window - 1:] = (table.prefix[:rows, window:self.months + 1] -
+                                     table.prefix[:rows, :self.months + 1 - window]) / window
+        return pd.DataFrame(means, index=table.names, columns=[period_name(self.start + m) for m in range(self.months)])
+
+    def anomalies(self, lookback: int = None, dimensions=None) -> list:
+        """Months whose spending is a spike against the months before them, largest z-score first."""
+        lookback = lookback or ANOMALY_LOOKBACK_MONTHS
+        found = []
+        if not self.months:
+            return found
+        columns = np.arange(max(self.months - lookback, 0), self.months)
+        history = np.minimum(columns, ANOMALY_HISTORY_MONTHS)
+        for dimension in dimensions or TREND_DIMENSIONS:
+            table = self.tables[dimension]
+            rows = len(table.names)
+            if not rows:
+                continue
+            spent = table.sums[:rows, columns]
+            total = table.prefix[:rows, columns] - table.prefix[:rows, columns - history]
+            squares = table.prefix_sq[:rows, columns] - table.prefix_sq[:rows, columns - history]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = total / history
+                std = np.sqrt(np.clip(squares / history - mean ** 2, 0, None))
+                z = (spent - mean) / std
+            flagged = (history >= ANOMALY_MIN_HISTORY_MONTHS) & (std > 0) & (z >= ANOMALY_Z) & \
+                (spent - mean >= ANOMALY_MIN_EXCESS_CENTS)
+            for row, column in zip(*np.nonzero(flagged)):
+                name = table.names[row]
+                if name is None:
+                    continue
+                found.append({"month": period_name(self.start + int(columns[column])), "dimension": dimension,
+                              "name": name, "spent": _dollars(spent[row, column]),
+                              "typical": _dollars(mean[row, column]), "z": round(float(z[row, column]), 1)})
+        found.sort(key=lambda anomaly: (-anomaly["z"], anomaly["month"], anomaly["dimension"], str(anomaly["name"])))
+        return found
+
+    def report(self) -> dict:
+        """The trends as JSON-ready dollars: inflow per month, rolling averages as of the latest month, and recent anomalies."""
+        if not self.months:
+            return {}
+        with span("aggregate.trends_report"):
+            def windows(averages):
+                return {f"{window}_month": _dollars(cents) for window, cents in averages.items()}
+
+            inflow = self.monthly(TOTALS, 'inflow')
+            rolling = {}
+            for dimension in TREND_DIMENSIONS:
+                rows = []
+                for name in self.tables[dimension].names:
+                    if name is None:
+                        continue
+                    averages = self.averages(dimension, name)
+                    latest = self.monthly(dimension, name)[-1]
+                    rows.append({"name": name, "latest": _dollars(latest), "average": windows(averages)})
+                # Biggest recent spenders first
+                rows.sort(key=lambda row: -(row["average"]["3_month"] or row["latest"] or 0))
+                rolling[dimension] = rows
+            return {
+                "latest_month": period_name(self.latest),
+                "months": self.months,
+                "inflow": {
+                    "monthly": [{"month": period_name(self.start + m), "inflow": _dollars(cents)}
+                                for m, cents in enumerate(inflow.tolist())],
+                    "average": windows(self.averages(TOTALS, 'inflow')),
+                },
+                "spending": {"average": windows(self.averages(TOTALS, 'outflow'))},
+                "rolling": rolling,
+                "anomalies": self.anomalies()[:MAX_ANOMALIES],
+            }
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from cube import SpendingCube
+
+# Cache location and size, overridable per deployment
+UPLOAD_CACHE_DIR = os.environ.get("UPLOAD_CACHE_DIR", ".upload_cache")
+UPLOAD_CACHE_MAX_BYTES = int(os.environ.get("UPLOAD_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+SCHEMA_FILE = "schema.json"
+CUBE_DIRECTORY = "cube"
+# Bump when the cleaned frame's layout changes so stale entries are never loaded
+CACHE_FORMAT_VERSION = b"4"
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def content_key(file) -> str:
+    """SHA-256 of an upload stream, leaving the stream rewound for parsing."""
+    digest = hashlib.sha256(CACHE_FORMAT_VERSION)
+    file.seek(0)
+    for block in iter(lambda: file.read(HASH_BLOCK_BYTES), b''):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def save_frame(directory: str, frame: pd.DataFrame):
+    """Write a frame as one .npy file per column plus a JSON schema; strings become categorical codes."""
+    schema = {"columns": []}
+    for i, name in enumerate(frame.columns):
+        series = frame[name]
+        if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series) \
+                or isinstance(series.dtype, pd.CategoricalDtype):
+            categorical = pd.Categorical(series)
+            np.save(os.path.join(directory, f"{i}.npy"), categorical.codes)
+            schema["columns"].append({"name": name, "kind": "categorical",
+                                      "categories": categorical.categories.tolist()})
+        else:
+            np.save(os.path.join(directory, f"{i}.npy"), series.to_numpy())
+            schema["columns"].append({"name": name, "kind": "array"})
+    with open(os.path.join(directory, SCHEMA_FILE), "w") as f:
+        json.dump(schema, f)
+
+
+def load_frame(directory: str) -> pd.DataFrame:
+    """Load a frame written by save_frame over memory-mapped, read-only columns."""
+    with open(os.path.join(directory, SCHEMA_FILE)) as f:
+        schema = json.load(f)
+    columns = {}
+    for i, column in enumerate(schema["columns"]):
+        values = np.load(os.path.join(directory, f"{i}.npy"), mmap_mode='r')
+        if column["kind"] == "categorical":
+            dtype = pd.CategoricalDtype(column["categories"])
+            values = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+        columns[column["name"]] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+class UploadCache:
+    """Cleaned upload frames and their recommendations on disk, keyed by upload content.
+
+    Each entry is a directory of .npy column files plus a JSON schema, with the upload's
+    SpendingCube saved alongside. Frames and cubes load as
+    memory-mapped, read-only arrays, so a hit costs a few file opens rather than a parse.
+    String columns are stored as categorical codes. Least recently used entries are
+    removed once the directory grows past max_bytes.
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = None):
+        self.directory = directory or UPLOAD_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else UPLOAD_CACHE_MAX_BYTES
+        self._lock = threading.Lock()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def load(self, key: str):
+        """Return (cube, frame) for a cached upload, or None on a miss."""
+        path = self._entry_path(key)
+        try:
+            frame = load_frame(path)
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return SpendingCube.load(os.path.join(path, CUBE_DIRECTORY)), frame
+
+    def store(self, key: str, cube: SpendingCube, frame: pd.DataFrame):
+        # Build the entry in a scratch directory and move it into place in one rename
+        os.makedirs(self.directory, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.directory, prefix=".staging-")
+        try:
+            save_frame(staging, frame)
+            os.makedirs(os.path.join(staging, CUBE_DIRECTORY))
+            cube.save(os.path.join(staging, CUBE_DIRECTORY))
+            os.replace(staging, self._entry_path(key))
+        except OSError:
+            # Another request stored the same upload first
+            shutil.rmtree(staging, ignore_errors=True)
+        self._evict()
+
+    def _recommendations_path(self, key: str, monthly_inflow: float) -> str:
+        return os.path.join(self._entry_path(key), f"recommendations-{float(monthly_inflow)!r}.json")
+
+    def load_recommendations(self, key: str, monthly_inflow: float):
+        try:
+            with open(self._recommendations_path(key, monthly_inflow)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def store_recommendations(self, key: str, monthly_inflow: float, recommendations: list):
+        if not os.path.isdir(self._entry_path(key)):
+            return
+        path = self._recommendations_path(key, monthly_inflow)
+        fd, scratch = tempfile.mkstemp(dir=self._entry_path(key), prefix=".staging-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(recommendations, f)
+        os.replace(scratch, path)
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total_bytes = 0
+            for name in os.listdir(self.directory):
+                path = self._entry_path(name)
+                if name.startswith(".") or not os.path.isdir(path):
+                    continue
+                nbytes = sum(os.path.getsize(os.path.join(root, filename))
+                             for root, _, filenames in os.walk(path) for filename in filenames)
+                entries.append((os.stat(path).st_mtime, nbytes, path))
+                total_bytes += nbytes
+            for _, nbytes, path in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+                # Open memory maps keep working after the files are unlinked
+                shutil.rmtree(path, ignore_errors=True)
+                total_bytes -= nbytes